@@ -0,0 +1,129 @@
+from collections import Counter, defaultdict
+import threading
+from types import SimpleNamespace
+
+def _amount(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def session_stats_result(registrations, paid, revenue, daily):
+    """The session statistics dict shared by every storage backend"""
+    return {
+        'registrations': registrations,
+        'paid': paid,
+        'pending': registrations - paid,
+        'revenue': round(revenue, 2),
+        'daily': [{'date': day, 'registrations': count} for day, count in sorted(daily.items()) if count]
+    }
+
+class SessionAggregates:
+    """Running per-session totals over participants and payments
+
+    Follows two tables through the listener interface of CSVTable.watch():
+    ``participant_feed`` and ``payment_feed`` each take reset(rows),
+    put(row) and discard(key). Every change only adjusts the totals of the
+    participant it touches, so reading a session's statistics costs the
+    same however many registrations there are.
+
+    A participant counts as paid when one of their payments is completed,
+    and the completed amounts make up the session's revenue. Registrations
+    are also counted per registration date.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._participants = {}
+        self._payments = {}
+        self._completed = defaultdict(dict)
+        self._totals = defaultdict(Counter)
+        self._daily = defaultdict(Counter)
+        self.participant_feed = SimpleNamespace(
+            reset=self._reset_participants, put=self._put_participant, discard=self._discard_participant)
+        self.payment_feed = SimpleNamespace(
+            reset=self._reset_payments, put=self._put_payment, discard=self._discard_payment)
+
+    def _count(self, participant_id, sign):
+        """Add (sign=1) or remove (sign=-1) a participant's share of their session's totals"""
+        session, day = self._participants[participant_id]
+        completed = self._completed.get(participant_id)
+        totals = self._totals[session]
+        totals['registrations'] += sign
+        if completed:
+            totals['paid'] += sign
+            totals['revenue'] += sign * sum(completed.values())
+        self._daily[session][day] += sign
+
+    def _recount(self):
+        self._totals = defaultdict(Counter)
+        self._daily = defaultdict(Counter)
+        for participant_id in self._participants:
+            self._count(participant_id, 1)
+
+    def _reset_participants(self, rows):
+        with self._lock:
+            self._participants = {row['id']: (row['session'], row['registration_date'] or '') for row in rows}
+            self._recount()
+
+    def _put_participant(self, row):
+        with self._lock:
+            if row['id'] in self._participants:
+                self._count(row['id'], -1)
+            self._participants[row['id']] = (row['session'], row['registration_date'] or '')
+            self._count(row['id'], 1)
+
+    def _discard_participant(self, participant_id):
+        with self._lock:
+            if participant_id in self._participants:
+                self._count(participant_id, -1)
+                del self._participants[participant_id]
+
+    def _store_payment(self, row):
+        self._payments[row['id']] = row['participant_id']
+        if row['status'] == 'completed':
+            self._completed[row['participant_id']][row['id']] = _amount(row['amount'])
+
+    def _forget_payment(self, payment_id):
+        participant_id = self._payments.pop(payment_id, None)
+        completed = self._completed.get(participant_id)
+        if completed is not None:
+            completed.pop(payment_id, None)
+            if not completed:
+                del self._completed[participant_id]
+        return participant_id
+
+    def _reset_payments(self, rows):
+        with self._lock:
+            self._payments = {}
+            self._completed = defaultdict(dict)
+            for row in rows:
+                self._store_payment(row)
+            self._recount()
+
+    def _change_payment(self, payment_id, row=None):
+        """Replace (or with row=None remove) a payment, recounting the participants involved"""
+        involved = {self._payments.get(payment_id), row and row['participant_id']} & self._participants.keys()
+        for participant_id in involved:
+            self._count(participant_id, -1)
+        self._forget_payment(payment_id)
+        if row is not None:
+            self._store_payment(row)
+        for participant_id in involved:
+            self._count(participant_id, 1)
+
+    def _put_payment(self, row):
+        with self._lock:
+            self._change_payment(row['id'], row)
+
+    def _discard_payment(self, payment_id):
+        with self._lock:
+            self._change_payment(payment_id)
+
+    def stats(self, session_id):
+        """Registrations, paid/pending counts, revenue and registrations per day of a session"""
+        session_id = str(session_id)
+        with self._lock:
+            totals = self._totals.get(session_id, Counter())
+            return session_stats_result(totals['registrations'], totals['paid'], totals['revenue'],
+                                        self._daily.get(session_id, {}))
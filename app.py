@@ -1,10 +1,27 @@
-from flask import Flask, render_template, request, redirect, url_for, send_file, flash
+from flask import (Flask, render_template, request, redirect, url_for, send_file, flash, Response, stream_with_context, g,
+                   make_response, session as flask_session)
+import atexit
+import click
+import cProfile
 import csv
-from datetime import datetime
+import hashlib
+import importlib.machinery
+import json
+import pstats
+import random
+import threading
+import time
+from datetime import datetime, timezone
 import os
-from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
+from io import BytesIO, StringIO, TextIOWrapper
 import logging
+from markupsafe import Markup
+import metrics
+from certificates import CertificateCache, certificate_etag, iter_certificates_zip, write_certificates_pdf
+from page_cache import PageCache
+from registration_queue import RegistrationQueue
+from search import ParticipantIndex
+from storage import CSVStorage, SessionFullError, SQLiteStorage, session_capacity
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this'  # Change this to a secure secret key
@@ -14,10 +31,51 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # File paths
-DATA_DIR = 'data'
+DATA_DIR = os.environ.get('DATA_DIR', 'data')
 PARTICIPANTS_CSV = os.path.join(DATA_DIR, 'participants.csv')
 SESSIONS_CSV = os.path.join(DATA_DIR, 'sessions.csv')
 PAYMENTS_CSV = os.path.join(DATA_DIR, 'payments.csv')
+CERTIFICATE_CACHE_DIR = os.path.join(DATA_DIR, 'certificates')
+CERTIFICATE_MIMETYPES = {'png': 'image/png', 'pdf': 'application/pdf'}
+
+# Participant exports
+EXPORT_FIELDS = ['id', 'name', 'email', 'session', 'session_name', 'registration_date',
+                 'payment_status', 'payment_amount']
+EXPORT_BATCH_ROWS = 500
+
+# Bulk participant imports
+IMPORT_REQUIRED_FIELDS = ['name', 'email', 'session']
+IMPORT_BATCH_ROWS = 1000
+SQLITE_DB = os.environ.get('SQLITE_DB', os.path.join(DATA_DIR, 'conference.db'))
+
+# Storage backend: 'csv' (default) or 'sqlite'
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'csv')
+
+# CSV files as append-only logs: edits and deletes append rows, and files are
+# compacted in the background once this share of their rows is dead
+CSV_APPEND_ONLY = os.environ.get('CSV_APPEND_ONLY') == '1'
+COMPACT_THRESHOLD = float(os.environ.get('COMPACT_THRESHOLD', '0.3'))
+COMPACT_INTERVAL = float(os.environ.get('COMPACT_INTERVAL', '300'))
+
+# Registrations acknowledged at once and written in batches by a background thread
+ASYNC_REGISTRATION = os.environ.get('ASYNC_REGISTRATION') == '1'
+REGISTRATION_QUEUE_SIZE = int(os.environ.get('REGISTRATION_QUEUE_SIZE', '10000'))
+# How long a success page reached through another worker waits for a queued registration
+REGISTRATION_PENDING_TIMEOUT = float(os.environ.get('REGISTRATION_PENDING_TIMEOUT', '60'))
+
+# Instrumentation: X-Debug-Timing header on every response, and cProfile for a
+# random share of requests (or any request sent with "X-Profile: 1" when enabled)
+DEBUG_TIMING = os.environ.get('DEBUG_TIMING') == '1'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_ON_DEMAND = os.environ.get('PROFILE_ON_DEMAND') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(DATA_DIR, 'profiles'))
+
+# Participants listing page size limit
+MAX_PER_PAGE = 500
+
+# Participant search results
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
 
 # Create data directory if it doesn't exist
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -46,12 +104,56 @@ def init_csv_files():
 
 init_csv_files()
 
+def create_storage(backend):
+    """Build the storage backend selected by STORAGE_BACKEND"""
+    if backend == 'csv':
+        return CSVStorage(PARTICIPANTS_CSV, SESSIONS_CSV, PAYMENTS_CSV, append_only=CSV_APPEND_ONLY)
+    if backend == 'sqlite':
+        return SQLiteStorage(SQLITE_DB)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+storage = create_storage(STORAGE_BACKEND)
+certificate_cache = CertificateCache(CERTIFICATE_CACHE_DIR)
+registration_queue = RegistrationQueue(storage, maxsize=REGISTRATION_QUEUE_SIZE)
+atexit.register(registration_queue.close)
+participant_index = ParticipantIndex()
+page_cache = PageCache()
+
+def templates_version():
+    """Hash of every template, so ETags change when a deploy changes the HTML"""
+    digest = hashlib.sha1()
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    for name in sorted(os.listdir(template_dir)):
+        with open(os.path.join(template_dir, name), 'rb') as f:
+            digest.update(name.encode('utf-8') + b'\0' + f.read())
+    return digest.hexdigest()
+
+TEMPLATES_VERSION = templates_version()
+
+def compact_storage(threshold=COMPACT_THRESHOLD):
+    """Compact the data files whose share of dead rows is above ``threshold``"""
+    try:
+        compacted = storage.compact(threshold)
+    except Exception as e:
+        logger.error(f"Error compacting storage: {e}")
+        return {}
+    for table, ratio in compacted.items():
+        logger.info(f"Compacted {table} ({ratio:.0%} dead rows)")
+    return compacted
+
+def run_compactor():
+    """Compact the append-only files every COMPACT_INTERVAL seconds"""
+    while True:
+        time.sleep(COMPACT_INTERVAL)
+        compact_storage()
+
+if CSV_APPEND_ONLY and STORAGE_BACKEND == 'csv':
+    threading.Thread(target=run_compactor, name='csv-compactor', daemon=True).start()
+
 def get_sessions():
-    """Retrieve all sessions from the CSV file"""
+    """Retrieve all sessions"""
     try:
-        with open(SESSIONS_CSV, 'r') as f:
-            reader = csv.DictReader(f)
-            return list(reader)
+        return storage.get_sessions()
     except Exception as e:
         logger.error(f"Error reading sessions: {e}")
         return []
@@ -59,8 +161,8 @@ def get_sessions():
 def get_session_name(session_id):
     """Get session name by ID"""
     try:
-        sessions = get_sessions()
-        return next((session['name'] for session in sessions if session['id'] == str(session_id)), '')
+        session = storage.get_session(session_id)
+        return session['name'] if session else ''
     except Exception as e:
         logger.error(f"Error getting session name: {e}")
         return ''
@@ -68,8 +170,7 @@ def get_session_name(session_id):
 def get_session_price(session_id):
     """Get session price by ID"""
     try:
-        sessions = get_sessions()
-        session = next((s for s in sessions if s['id'] == str(session_id)), None)
+        session = storage.get_session(session_id)
         return float(session['price']) if session else 0.0
     except Exception as e:
         logger.error(f"Error getting session price: {e}")
@@ -85,29 +186,19 @@ def validate_payment(amount, session_id):
         return False
 
 def add_participant(name, email, session):
-    """Add a new participant to the CSV file"""
+    """Add a new participant"""
     try:
-        participant_id = len(get_participants()) + 1
-        with open(PARTICIPANTS_CSV, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                participant_id,
-                name,
-                email,
-                session,
-                datetime.now().strftime('%Y-%m-%d')
-            ])
+        participant_id = storage.add_participant(name, email, session, datetime.now().strftime('%Y-%m-%d'))
+        page_cache.invalidate()
         return participant_id
     except Exception as e:
         logger.error(f"Error adding participant: {e}")
         raise
 
 def get_participants():
-    """Retrieve all participants from the CSV file"""
+    """Retrieve all participants"""
     try:
-        with open(PARTICIPANTS_CSV, 'r') as f:
-            reader = csv.DictReader(f)
-            return list(reader)
+        return storage.get_participants()
     except Exception as e:
         logger.error(f"Error reading participants: {e}")
         return []
@@ -115,8 +206,7 @@ def get_participants():
 def get_participant(participant_id):
     """Get participant by ID"""
     try:
-        participants = get_participants()
-        return next((p for p in participants if p['id'] == str(participant_id)), None)
+        return storage.get_participant(participant_id)
     except Exception as e:
         logger.error(f"Error getting participant: {e}")
         return None
@@ -124,27 +214,13 @@ def get_participant(participant_id):
 def update_participant(participant_id, name, email, session):
     """Update participant information"""
     try:
-        participants = get_participants()
-        updated = False
-        updated_participants = []
-        
-        for participant in participants:
-            if participant['id'] == str(participant_id):
-                participant.update({
-                    'name': name,
-                    'email': email,
-                    'session': session
-                })
-                updated = True
-            updated_participants.append(participant)
-        
+        updated = storage.update_participant(participant_id, name, email, session)
         if updated:
-            with open(PARTICIPANTS_CSV, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=['id', 'name', 'email', 'session', 'registration_date'])
-                writer.writeheader()
-                writer.writerows(updated_participants)
-            return True
-        return False
+            certificate_cache.invalidate(participant_id)
+            page_cache.invalidate()
+        return updated
+    except SessionFullError:
+        raise
     except Exception as e:
         logger.error(f"Error updating participant: {e}")
         return False
@@ -152,20 +228,10 @@ def update_participant(participant_id, name, email, session):
 def delete_participant(participant_id):
     """Delete participant and associated payment"""
     try:
-        # Remove participant
-        participants = [p for p in get_participants() if p['id'] != str(participant_id)]
-        with open(PARTICIPANTS_CSV, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['id', 'name', 'email', 'session', 'registration_date'])
-            writer.writeheader()
-            writer.writerows(participants)
-        
-        # Remove associated payment
-        payments = [p for p in get_payments() if p['participant_id'] != str(participant_id)]
-        with open(PAYMENTS_CSV, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['id', 'participant_id', 'amount', 'payment_date', 'status'])
-            writer.writeheader()
-            writer.writerows(payments)
-        return True
+        deleted = storage.delete_participant(participant_id)
+        certificate_cache.invalidate(participant_id)
+        page_cache.invalidate()
+        return deleted
     except Exception as e:
         logger.error(f"Error deleting participant: {e}")
         return False
@@ -173,27 +239,17 @@ def delete_participant(participant_id):
 def add_payment(participant_id, amount):
     """Add a new payment record"""
     try:
-        payment_id = len(get_payments()) + 1
-        with open(PAYMENTS_CSV, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                payment_id,
-                participant_id,
-                amount,
-                datetime.now().strftime('%Y-%m-%d'),
-                'completed'
-            ])
+        payment_id = storage.add_payment(participant_id, amount, datetime.now().strftime('%Y-%m-%d'))
+        page_cache.invalidate()
         return payment_id
     except Exception as e:
         logger.error(f"Error adding payment: {e}")
         raise
 
 def get_payments():
-    """Retrieve all payments from the CSV file"""
+    """Retrieve all payments"""
     try:
-        with open(PAYMENTS_CSV, 'r') as f:
-            reader = csv.DictReader(f)
-            return list(reader)
+        return storage.get_payments()
     except Exception as e:
         logger.error(f"Error reading payments: {e}")
         return []
@@ -201,84 +257,292 @@ def get_payments():
 def get_participant_payment(participant_id):
     """Get payment information for a participant"""
     try:
-        payments = get_payments()
-        return next((p for p in payments if p['participant_id'] == str(participant_id)), None)
+        return storage.get_participant_payment(participant_id)
     except Exception as e:
         logger.error(f"Error getting participant payment: {e}")
         return None
 
-def generate_certificate(name, session_name, date):
-    """Generate a certificate as a PNG image"""
+def register_participant(name, email, session):
+    """Add a participant and its payment together"""
     try:
-        width = 1000
-        height = 700
-        image = Image.new('RGB', (width, height), 'white')
-        draw = ImageDraw.Draw(image)
-        
-        # Draw border
-        draw.rectangle([(40, 40), (width-40, height-40)], outline='#4F46E5', width=3)
-        draw.rectangle([(50, 50), (width-50, height-50)], outline='#4F46E5', width=1)
-        
-        # Try different font paths
-        font_paths = [
-            'arial.ttf',
-            '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-            '/System/Library/Fonts/Helvetica.ttc',
-            'DejaVuSans.ttf'
-        ]
-        
-        # Find working font
-        fonts = {'large': None, 'medium': None, 'small': None}
-        for font_path in font_paths:
-            try:
-                fonts['large'] = ImageFont.truetype(font_path, 48)
-                fonts['medium'] = ImageFont.truetype(font_path, 36)
-                fonts['small'] = ImageFont.truetype(font_path, 24)
-                break
-            except Exception:
-                continue
-        
-        # Fallback to default if no fonts work
-        if not fonts['large']:
-            fonts = {
-                'large': ImageFont.load_default(),
-                'medium': ImageFont.load_default(),
-                'small': ImageFont.load_default()
-            }
-        
-        # Draw certificate text
-        text_items = [
-            (width/2, 150, 'Certificate of Completion', '#1F2937', fonts['large']),
-            (width/2, 250, 'This certifies that', '#4B5563', fonts['small']),
-            (width/2, 300, name, '#1F2937', fonts['medium']),
-            (width/2, 350, 'has successfully completed', '#4B5563', fonts['small']),
-            (width/2, 400, session_name, '#1F2937', fonts['medium']),
-            (width/2, 500, f'Date: {date}', '#4B5563', fonts['small'])
-        ]
-        
-        for x, y, text, fill, font in text_items:
-            try:
-                draw.text((x, y), text, fill=fill, font=font, anchor='mm')
-            except Exception:
-                # Fallback without anchor if it fails
-                text_width = font.getsize(text)[0]
-                draw.text((x - text_width/2, y), text, fill=fill, font=font)
-        
-        # Save to BytesIO
-        img_io = BytesIO()
-        image.save(img_io, 'PNG', quality=95)
-        img_io.seek(0)
-        return img_io
+        registration_date = datetime.now().strftime('%Y-%m-%d')
+        ids = storage.register(name, email, session, get_session_price(session), registration_date)
+        page_cache.invalidate()
+        return ids
+    except SessionFullError:
+        raise
     except Exception as e:
-        logger.error(f"Error generating certificate: {e}")
+        logger.error(f"Error registering participant: {e}")
+        raise
+
+def enqueue_registration(name, email, session):
+    """Queue a registration for the background writer and return its participant id"""
+    try:
+        registration_date = datetime.now().strftime('%Y-%m-%d')
+        participant_id = registration_queue.submit(
+            (name, email, session, get_session_price(session), registration_date),
+            capacity=session_capacity(storage.get_session(session) or {}),
+            occupied=storage.session_occupancy().get(session, 0)
+        )
+        # The seat is taken from now on, even before the writer records it
+        page_cache.invalidate()
+        return participant_id
+    except SessionFullError:
+        raise
+    except Exception as e:
+        logger.error(f"Error queueing registration: {e}")
+        raise
+
+def registration_in_flight(participant_id, queued_at):
+    """Whether a registration queued at ``queued_at`` may still be on its way to storage
+
+    Covers registrations accepted by another worker process, whose queue
+    this process cannot see: the id was reserved but is not written yet.
+    """
+    if time.time() - queued_at > REGISTRATION_PENDING_TIMEOUT:
+        return False
+    try:
+        return storage.participant_id_reserved(participant_id) and storage.get_participant(participant_id) is None
+    except Exception as e:
+        logger.error(f"Error checking queued registration: {e}")
+        return False
+
+def import_participants(lines):
+    """Validate and register participants from CSV lines, in batches
+
+    Returns the number of imported rows and a list of (line number, error)
+    for the rows that were rejected.
+    """
+    reader = csv.DictReader(lines)
+    missing_columns = [field for field in IMPORT_REQUIRED_FIELDS if field not in (reader.fieldnames or [])]
+    if missing_columns:
+        return 0, [(1, f"Missing column(s): {', '.join(missing_columns)}")]
+
+    prices = {session['id']: None for session in get_sessions()}
+    registration_date = datetime.now().strftime('%Y-%m-%d')
+    imported, errors, batch, batch_lines = 0, [], [], []
+    for row in reader:
+        name, email, session = [(row.get(field) or '').strip() for field in IMPORT_REQUIRED_FIELDS]
+        missing = [field for field, value in zip(IMPORT_REQUIRED_FIELDS, (name, email, session)) if not value]
+        if missing:
+            errors.append((reader.line_num, f"Missing {', '.join(missing)}"))
+            continue
+        if '@' not in email:
+            errors.append((reader.line_num, f"Invalid email: {email}"))
+            continue
+        if session not in prices:
+            errors.append((reader.line_num, f"Unknown session: {session}"))
+            continue
+        if prices[session] is None:
+            prices[session] = get_session_price(session)
+
+        batch.append((name, email, session, prices[session], registration_date))
+        batch_lines.append(reader.line_num)
+        if len(batch) >= IMPORT_BATCH_ROWS:
+            imported += _register_import_batch(batch, batch_lines, errors)
+            batch, batch_lines = [], []
+    if batch:
+        imported += _register_import_batch(batch, batch_lines, errors)
+    errors.sort()
+    return imported, errors
+
+def _register_import_batch(batch, lines, errors):
+    """Write one import batch, reporting the rows refused for lack of seats"""
+    participant_ids = storage.register_many(batch)
+    page_cache.invalidate()
+    for line, participant_id, registration in zip(lines, participant_ids, batch):
+        if participant_id is None:
+            errors.append((line, f"Session {registration[2]} is full"))
+    return sum(1 for participant_id in participant_ids if participant_id is not None)
+
+def get_sessions_with_seats():
+    """Retrieve all sessions with the number of seats left (None when unlimited)"""
+    sessions = get_sessions()
+    try:
+        occupancy = storage.session_occupancy()
+    except Exception as e:
+        logger.error(f"Error reading session occupancy: {e}")
+        occupancy = {}
+    for session in sessions:
+        capacity = session_capacity(session)
+        taken = occupancy.get(session['id'], 0) + registration_queue.pending_seats(session['id'])
+        session['seats_left'] = None if capacity is None else max(capacity - taken, 0)
+    return sessions
+
+def list_participants(page=1, per_page=50, session=None, status=None):
+    """Return one page of the joined participant listing and whether more pages follow"""
+    rows = storage.list_participants((page - 1) * per_page, per_page + 1, session, status)
+    return rows[:per_page], len(rows) > per_page
+
+def search_participants(query, limit=SEARCH_DEFAULT_LIMIT):
+    """Participants whose name or email starts with or contains ``query``"""
+    # The index is built on first use and follows storage writes after that
+    participant_index.sync(storage)
+    results = []
+    for participant_id in participant_index.search(query, limit):
+        participant = get_participant(participant_id)
+        if participant:
+            participant['session_name'] = get_session_name(participant['session'])
+            results.append(participant)
+    return results
+
+def get_session_stats(session_id):
+    """Registration and payment totals of a session, plus its registrations still queued"""
+    try:
+        stats = storage.session_stats(session_id)
+    except Exception as e:
+        logger.error(f"Error getting session stats: {e}")
         raise
+    stats['queued'] = registration_queue.pending_seats(session_id)
+    return stats
+
+def page_validators(tables, *extra):
+    """ETag and Last-Modified of the current page, derived from the storage tables it shows"""
+    version, modified = storage.data_version(tables)
+    key = '\x1f'.join([TEMPLATES_VERSION, request.full_path, version, *map(str, extra)])
+    last_modified = None if modified is None else datetime.fromtimestamp(int(modified), timezone.utc)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest(), last_modified
+
+def with_validators(response, etag, last_modified):
+    """Attach the validators and make clients revalidate before reusing the page"""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+def not_modified(etag, last_modified):
+    """A 304 response when the client's copy is current, otherwise None"""
+    if request.if_none_match:
+        fresh = etag in request.if_none_match
+    else:
+        fresh = (request.if_modified_since is not None and last_modified is not None
+                 and last_modified <= request.if_modified_since)
+    return with_validators(app.response_class(status=304), etag, last_modified) if fresh else None
+
+def session_options(version, selected=None, with_seats=False):
+    """The <option> list of the session selects, rendered once per data version"""
+    def render():
+        sessions = get_sessions_with_seats() if with_seats else get_sessions()
+        return render_template('_session_options.html', sessions=sessions, selected=selected)
+    return Markup(page_cache.get_or_render(('session_options', selected, with_seats), version, render))
+
+def certificate_filename(participant, extension='png'):
+    """Download name of a participant's certificate"""
+    return f"certificate_{participant['name'].lower().replace(' ', '_')}.{extension}"
+
+def session_certificate_jobs(session_id):
+    """Yield certificate render jobs for every paid participant of a session"""
+    session_name = get_session_name(session_id)
+    for participant in storage.iter_participants(session=str(session_id), status='completed'):
+        yield (
+            f"{participant['id']}_{certificate_filename(participant)}",
+            participant['name'],
+            session_name,
+            participant['registration_date']
+        )
+
+def iter_export_csv(rows):
+    """Encode joined participants as CSV, a batch of rows at a time"""
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_export_ndjson(rows):
+    """Encode joined participants as newline-delimited JSON, a batch of rows at a time"""
+    batch = []
+    for row in rows:
+        batch.append(json.dumps({field: row.get(field, '') for field in EXPORT_FIELDS}))
+        if len(batch) == EXPORT_BATCH_ROWS:
+            yield '\n'.join(batch) + '\n'
+            batch = []
+    if batch:
+        yield '\n'.join(batch) + '\n'
+
+# Request instrumentation
+# Only one profiler can be enabled per process, so overlapping requests
+# take turns: a sampled request that finds it busy is simply not profiled
+profiler_lock = threading.Lock()
+
+def start_profiler():
+    """Enable a profiler for this request, or return None when one is already running"""
+    if not profiler_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool (a debugger, coverage) holds the hook
+        profiler_lock.release()
+        return None
+    return profiler
+
+def stop_profiler():
+    """Disable the request's profiler and let the next request profile; returns it"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        profiler_lock.release()
+    return profiler
+
+@app.before_request
+def start_request_metrics():
+    """Start the request timer, I/O counters and (when sampled) the profiler"""
+    g.request_started = time.perf_counter()
+    g.request_stats = metrics.start_request()
+    if (PROFILE_ON_DEMAND and request.headers.get('X-Profile') == '1') or random.random() < PROFILE_SAMPLE_RATE:
+        profiler = start_profiler()
+        if profiler is not None:
+            g.profiler = profiler
+
+@app.after_request
+def record_request_metrics(response):
+    """Record route latency, attach X-Debug-Timing and save any profile"""
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    stats = metrics.finish_request()
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe_request(route, request.method, response.status_code, elapsed)
+
+    profiler = stop_profiler()
+    if profiler is not None:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{request.endpoint}.prof")
+        profiler.dump_stats(path)
+        top = StringIO()
+        pstats.Stats(profiler, stream=top).sort_stats('cumulative').print_stats(15)
+        logger.info(f"Profile of {request.method} {request.path} saved to {path}\n{top.getvalue()}")
+
+    if DEBUG_TIMING:
+        counters = ', '.join(f'{name}={stats[name]}' for name in metrics.REQUEST_COUNTERS)
+        response.headers['X-Debug-Timing'] = f'total={elapsed * 1000:.2f}ms, {counters}'
+    return response
+
+@app.teardown_request
+def release_request_profiler(exc):
+    """Stop a profiler that after_request never reached (an unhandled error)"""
+    stop_profiler()
 
 # Routes
 @app.route('/')
 def index():
     """Home page route"""
-    sessions = get_sessions()
-    return render_template('index.html', sessions=sessions)
+    # Seats left also move with registrations still waiting in the queue
+    etag, last_modified = page_validators(('sessions', 'participants'), registration_queue.version)
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    html = page_cache.get_or_render(('index',), etag, lambda: render_template(
+        'index.html',
+        sessions=get_sessions_with_seats(),
+        session_options=session_options(etag, with_seats=True)
+    ))
+    return with_validators(make_response(html), etag, last_modified)
 
 @app.route('/register', methods=['POST'])
 def register():
@@ -292,19 +556,20 @@ def register():
             flash('Please fill in all required fields.', 'error')
             return redirect(url_for('index'))
         
-        participant_id = add_participant(name, email, session)
-        session_price = get_session_price(session)
-        
-        # Process payment
-        try:
-            payment_id = add_payment(participant_id, session_price)
+        if ASYNC_REGISTRATION:
+            participant_id = enqueue_registration(name, email, session)
             flash('Registration successful!', 'success')
-            return redirect(url_for('success', participant_id=participant_id))
-        except Exception as e:
-            logger.error(f"Payment processing error: {e}")
-            flash('Error processing payment. Please try again.', 'error')
-            return redirect(url_for('index'))
-            
+            # The success page may be served by another worker, which only learns from the
+            # URL that this registration is still queued
+            return redirect(url_for('success', participant_id=participant_id, queued=int(time.time())))
+        # Participant and payment are recorded together (one transaction on SQLite)
+        participant_id, payment_id = register_participant(name, email, session)
+        flash('Registration successful!', 'success')
+        return redirect(url_for('success', participant_id=participant_id))
+
+    except SessionFullError:
+        flash('Sorry, this session is full.', 'error')
+        return redirect(url_for('index'))
     except Exception as e:
         logger.error(f"Registration error: {e}")
         flash('An error occurred during registration. Please try again.', 'error')
@@ -313,44 +578,123 @@ def register():
 @app.route('/success/<int:participant_id>')
 def success(participant_id):
     """Success page after registration"""
+    state = registration_queue.status(participant_id)
+    queued_at = request.args.get('queued', type=float)
+    if state is None and queued_at is not None and registration_in_flight(participant_id, queued_at):
+        state = 'pending'
+    if state == 'pending':
+        # Still queued: the page refreshes itself until the payment is recorded
+        return render_template('success.html', processing=True, participant_id=participant_id)
+    if state:
+        flash(f'Your registration could not be completed: {state}.', 'error')
+        return redirect(url_for('index'))
+
+    etag, last_modified = page_validators(('participants', 'payments', 'sessions'))
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
     participant = get_participant(participant_id)
     if participant:
         session_name = get_session_name(participant['session'])
         payment = get_participant_payment(participant_id)
-        return render_template('success.html', 
+        return with_validators(make_response(render_template('success.html', 
                              participant=participant,
                              session_name=session_name,
-                             payment=payment)
+                             payment=payment)), etag, last_modified)
+    if queued_at is not None:
+        flash('Your registration could not be confirmed. Please check with the organizers before registering again.', 'error')
     return redirect(url_for('index'))
 
 @app.route('/participants')
 def participants():
-    """List all participants"""
+    """List participants, one page at a time"""
     try:
-        # Read participants data
-        with open(PARTICIPANTS_CSV, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            all_participants = list(reader)
-
-        # Get additional information for each participant
-        for participant in all_participants:
-            # Get session name
-            participant['session_name'] = get_session_name(participant['session'])
-            
-            # Get payment info
-            payment = get_participant_payment(participant['id'])
-            participant['payment_status'] = payment['status'] if payment else 'Pending'
-            if payment:
-                participant['payment_amount'] = payment['amount']
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PER_PAGE)
+        filters = {
+            'session': request.args.get('session') or None,
+            'status': request.args.get('status') or None
+        }
+
+        # Pending flash messages are shown (and used up) by this page, so it must be rendered
+        validators = None
+        if '_flashes' not in flask_session:
+            validators = page_validators(('participants', 'payments', 'sessions'))
+            response = not_modified(*validators)
+            if response is not None:
+                return response
+
+        page_participants, has_next = list_participants(page, per_page, **filters)
             
-        return render_template('participants.html', 
-                             participants=all_participants,
-                             sessions=get_sessions())
+        response = make_response(render_template('participants.html', 
+                             participants=page_participants,
+                             sessions=get_sessions(),
+                             page=page,
+                             per_page=per_page,
+                             has_next=has_next,
+                             filters=filters))
+        return with_validators(response, *validators) if validators else response
     except Exception as e:
         logger.error(f"Error loading participants: {e}")
         flash('Error loading participants list.', 'error')
         return redirect(url_for('index'))
 
+@app.route('/participants/search')
+def search_participants_route():
+    """JSON search over participant names and emails"""
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), 1), SEARCH_MAX_LIMIT)
+    try:
+        results = search_participants(query, limit) if query else []
+    except Exception as e:
+        logger.error(f"Error searching participants: {e}")
+        return {'error': 'Search failed'}, 500
+    return {
+        'query': query,
+        'results': [
+            dict({field: participant[field] for field in ('id', 'name', 'email', 'session', 'session_name')},
+                 edit_url=url_for('edit_participant_route', participant_id=participant['id']))
+            for participant in results
+        ]
+    }
+
+@app.route('/participants/export.csv')
+def export_participants_csv():
+    """Stream every participant, joined with session and payment, as CSV"""
+    rows = storage.iter_participants(request.args.get('session') or None, request.args.get('status') or None)
+    return Response(
+        stream_with_context(iter_export_csv(rows)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=participants.csv'}
+    )
+
+@app.route('/participants/export.ndjson')
+def export_participants_ndjson():
+    """Stream every participant, joined with session and payment, as NDJSON"""
+    rows = storage.iter_participants(request.args.get('session') or None, request.args.get('status') or None)
+    return Response(
+        stream_with_context(iter_export_ndjson(rows)),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=participants.ndjson'}
+    )
+
+@app.route('/participants/import', methods=['GET', 'POST'])
+def import_participants_route():
+    """Upload a CSV of registrations (name, email, session)"""
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a CSV file to import.', 'error')
+            return redirect(url_for('import_participants_route'))
+        try:
+            imported, errors = import_participants(TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''))
+        except Exception as e:
+            logger.error(f"Error importing participants: {e}")
+            flash('Error importing participants.', 'error')
+            return redirect(url_for('import_participants_route'))
+        return render_template('import.html', imported=imported, errors=errors)
+    return render_template('import.html')
+
 @app.route('/edit/<int:participant_id>', methods=['GET', 'POST'])
 def edit_participant_route(participant_id):
     """Edit participant information"""
@@ -370,7 +714,10 @@ def edit_participant_route(participant_id):
             else:
                 flash('Participant not found!', 'error')
                 return redirect(url_for('participants'))
-                
+
+        except SessionFullError:
+            flash('That session is full.', 'error')
+            return redirect(url_for('edit_participant_route', participant_id=participant_id))
         except Exception as e:
             logger.error(f"Error updating participant: {e}")
             flash('Error updating participant.', 'error')
@@ -378,9 +725,10 @@ def edit_participant_route(participant_id):
     
     participant = get_participant(participant_id)
     if participant:
+        sessions_version, _ = storage.data_version(('sessions',))
         return render_template('edit.html', 
                              participant=participant,
-                             sessions=get_sessions())
+                             session_options=session_options(sessions_version, selected=participant['session']))
     return redirect(url_for('participants'))
 
 @app.route('/delete/<int:participant_id>')
@@ -407,23 +755,162 @@ def certificate(participant_id):
             flash('Certificate not available. Please ensure payment is completed.', 'error')
             return redirect(url_for('participants'))
         
+        fmt = request.args.get('format', 'png')
+        if fmt not in CERTIFICATE_MIMETYPES:
+            flash('Unknown certificate format.', 'error')
+            return redirect(url_for('participants'))
+
         session_name = get_session_name(participant['session'])
-        certificate_img = generate_certificate(
-            participant['name'],
-            session_name,
-            participant['registration_date']
-        )
-        
+        certificate_args = (participant_id, participant['name'], session_name, participant['registration_date'], fmt)
+
+        # Repeat downloads of an unchanged certificate cost nothing
+        etag = certificate_etag(*certificate_args)
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        etag, certificate_data = certificate_cache.get_or_render(*certificate_args)
         return send_file(
-            certificate_img,
-            mimetype='image/png',
+            BytesIO(certificate_data),
+            mimetype=CERTIFICATE_MIMETYPES[fmt],
             as_attachment=True,
-            download_name=f"certificate_{participant['name'].lower().replace(' ', '_')}.png"
+            download_name=certificate_filename(participant, fmt),
+            etag=etag,
+            max_age=0
         )
     except Exception as e:
         logger.error(f"Error generating certificate: {e}")
         flash('An error occurred while generating the certificate.', 'error')
         return redirect(url_for('participants'))
 
+@app.route('/sessions/<int:session_id>/certificates.zip')
+def session_certificates(session_id):
+    """Download the certificates of every paid participant of a session as one ZIP"""
+    if not get_session_name(session_id):
+        flash('Session not found.', 'error')
+        return redirect(url_for('participants'))
+
+    # Entries are streamed out as the worker processes finish them
+    return Response(
+        stream_with_context(iter_certificates_zip(session_certificate_jobs(session_id))),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename=session_{session_id}_certificates.zip'}
+    )
+
+@app.route('/sessions/<int:session_id>/certificates.pdf')
+def session_certificates_pdf(session_id):
+    """Download the certificates of every paid participant of a session as one PDF"""
+    session_name = get_session_name(session_id)
+    if not session_name:
+        flash('Session not found.', 'error')
+        return redirect(url_for('participants'))
+
+    # Pages are added one participant at a time on top of the shared background
+    pdf_io = BytesIO()
+    write_certificates_pdf((job[1:] for job in session_certificate_jobs(session_id)), pdf_io)
+    pdf_io.seek(0)
+    return send_file(
+        pdf_io,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f'session_{session_id}_certificates.pdf'
+    )
+
+@app.route('/sessions/<int:session_id>/stats')
+def session_stats(session_id):
+    """Registration and payment dashboard of a session"""
+    etag, last_modified = page_validators(('participants', 'payments', 'sessions'), registration_queue.version)
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    try:
+        session = storage.get_session(session_id)
+        if not session:
+            flash('Session not found.', 'error')
+            return redirect(url_for('participants'))
+        stats = get_session_stats(session_id)
+    except Exception:
+        flash('Error loading session statistics.', 'error')
+        return redirect(url_for('participants'))
+    capacity = session_capacity(session)
+    busiest_day = max((day['registrations'] for day in stats['daily']), default=0)
+    return with_validators(make_response(render_template('session_stats.html',
+                         session=session,
+                         capacity=capacity,
+                         stats=stats,
+                         busiest_day=busiest_day)), etag, last_modified)
+
+@app.route('/sessions/<int:session_id>/stats.json')
+def session_stats_json(session_id):
+    """Registration and payment totals of a session as JSON"""
+    etag, last_modified = page_validators(('participants', 'payments', 'sessions'), registration_queue.version)
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    try:
+        session = storage.get_session(session_id)
+        if not session:
+            return {'error': 'Session not found'}, 404
+        stats = get_session_stats(session_id)
+    except Exception:
+        return {'error': 'Statistics unavailable'}, 500
+    return with_validators(make_response(dict(stats, session=session['id'], name=session['name'],
+                                              capacity=session_capacity(session))), etag, last_modified)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics of this worker process"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+# CLI commands
+@app.cli.command('migrate-csv')
+@click.option('--database', default=SQLITE_DB, show_default=True, help='SQLite database to fill.')
+def migrate_csv_command(database):
+    """Copy data/*.csv into the SQLite database"""
+    source = CSVStorage(PARTICIPANTS_CSV, SESSIONS_CSV, PAYMENTS_CSV, append_only=CSV_APPEND_ONLY)
+    SQLiteStorage(database).import_from(source)
+    click.echo(f"Migrated {len(source.get_participants())} participants, "
+               f"{len(source.get_sessions())} sessions and {len(source.get_payments())} payments to {database}")
+
+@app.cli.command('compact')
+@click.option('--threshold', type=float, default=COMPACT_THRESHOLD, show_default=True,
+              help='Only compact files with a larger share of dead rows (0 compacts any dead row).')
+def compact_command(threshold):
+    """Rewrite the append-only CSV files without their dead rows"""
+    compacted = compact_storage(threshold)
+    for table, ratio in compacted.items():
+        click.echo(f"Compacted {table}: {ratio:.0%} of its rows were dead")
+    if not compacted:
+        click.echo("Nothing to compact")
+
+@app.cli.command('certificates')
+@click.argument('session_id', type=int)
+@click.option('--output', type=click.Path(dir_okay=False), help='ZIP file to write (default: session_<id>_certificates.zip).')
+@click.option('--workers', type=int, default=None, help='Render processes (default: one per CPU).')
+def certificates_command(session_id, output, workers):
+    """Render every paid certificate of a session into a ZIP file"""
+    if not get_session_name(session_id):
+        raise click.ClickException(f"Session {session_id} not found")
+    output = output or f'session_{session_id}_certificates.zip'
+    with open(output, 'wb') as f:
+        for chunk in iter_certificates_zip(session_certificate_jobs(session_id), max_workers=workers):
+            f.write(chunk)
+    click.echo(f"Wrote {output}")
+
+@app.cli.command('import-participants')
+@click.argument('csv_file', type=click.Path(exists=True, dir_okay=False))
+def import_participants_command(csv_file):
+    """Register every row of a CSV file with name, email and session columns"""
+    with open(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+        imported, errors = import_participants(f)
+    for line, error in errors:
+        click.echo(f"line {line}: {error}", err=True)
+    click.echo(f"Imported {imported} participants, rejected {len(errors)} rows")
+
 if __name__ == '__main__':
+    # Certificate render workers run a script's __main__ again as __mp_main__,
+    # which would open the storage and start its threads in each of them; a
+    # module named __main__ is one multiprocessing leaves alone
+    __spec__ = importlib.machinery.ModuleSpec('__main__', None)
     app.run(debug=True)
\ No newline at end of file
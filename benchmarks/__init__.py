@@ -0,0 +1,9 @@
+"""Benchmarks for the registration app
+
+    python -m benchmarks --participants 10000 --output results.json
+
+runs the load test and the micro-benchmarks against a synthetic dataset
+and writes the results as JSON, tagged with the current git commit so runs
+can be compared across commits. The other modules can be run on their own
+with ``python -m benchmarks.<module>``.
+"""
@@ -0,0 +1,71 @@
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import load, micro
+from benchmarks.datasets import prepare_app
+
+# The checkout the benchmarked code comes from, wherever the run starts
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_revision():
+    """Current commit and whether the working tree has local changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('--participants', type=int, default=10_000, help='dataset size')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=1, help='threads or processes driving each route')
+    parser.add_argument('--mode', choices=['threads', 'processes'], default='threads')
+    parser.add_argument('--routes', nargs='+', choices=load.ROUTES, default=load.ROUTES)
+    parser.add_argument('--micro-iterations', type=int, default=1000)
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    commit, dirty = git_revision()
+    with tempfile.TemporaryDirectory() as directory:
+        app = prepare_app(directory, args.participants, seed=args.seed)
+        results = {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'backend': app.STORAGE_BACKEND,
+            'async_registration': app.ASYNC_REGISTRATION,
+            'csv_append_only': app.CSV_APPEND_ONLY,
+            'config': {name: value for name, value in vars(args).items() if name != 'output'},
+            # Load first: the micro-benchmarks update and delete rows
+            'load': load.run(app, args.routes, args.requests, args.concurrency, args.mode, args.seed),
+        }
+        if not args.skip_micro:
+            results['micro'] = micro.run(app, args.micro_iterations, args.seed)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Time a bulk registration import through app.import_participants
+
+Writes a synthetic registrations CSV and imports it into a fresh data
+directory with the CSV backend (or STORAGE_BACKEND=sqlite). The sessions
+have room for every row, so none is rejected for capacity.
+
+    python -m benchmarks.bench_import [ROWS]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.datasets import prepare_app
+
+DEFAULT_ROWS = 100_000
+
+
+def write_registrations(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'email', 'session'])
+        for i in range(rows):
+            writer.writerow([f'Person {i}', f'person{i}@example.com', i % 3 + 1])
+
+
+def main(rows):
+    with tempfile.TemporaryDirectory() as directory:
+        app = prepare_app(directory, 0, capacity=rows)
+
+        source = os.path.join(directory, 'registrations.csv')
+        write_registrations(source, rows)
+        start = time.perf_counter()
+        with open(source, newline='') as f:
+            imported, errors = app.import_participants(f)
+        elapsed = time.perf_counter() - start
+        print(f'{app.STORAGE_BACKEND}: imported {imported} rows ({len(errors)} errors) in {elapsed:.2f}s '
+              f'({imported / elapsed:,.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS)
@@ -0,0 +1,73 @@
+"""Per-request lookup latency: full CSV rescans vs. the cached CSVTable indexes
+
+Simulates the lookups done by one ``/success/<id>`` request (participant,
+session name, payment) against synthetic data files.
+
+    python -m benchmarks.bench_repository [SIZE ...]
+"""
+import csv
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.datasets import write_dataset
+from storage import CSVTable
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def read_all(path):
+    with open(path, 'r') as f:
+        return list(csv.DictReader(f))
+
+
+def legacy_request(paths, participant_id):
+    """The lookups a request did before the cache: parse and scan each file"""
+    participant = next((p for p in read_all(paths['participants']) if p['id'] == str(participant_id)), None)
+    session_name = next((s['name'] for s in read_all(paths['sessions']) if s['id'] == participant['session']), '')
+    payment = next((p for p in read_all(paths['payments']) if p['participant_id'] == str(participant_id)), None)
+    return participant, session_name, payment
+
+
+def cached_request(tables, participant_id):
+    participants, sessions, payments = tables
+    participant = participants.get(participant_id)
+    session = sessions.get(participant['session'])
+    payment = payments.first('participant_id', participant_id)
+    return participant, session['name'] if session else '', payment
+
+
+def measure(func, ids):
+    start = time.perf_counter()
+    for participant_id in ids:
+        func(participant_id)
+    return (time.perf_counter() - start) / len(ids)
+
+
+def main(sizes):
+    print(f"{'participants':>12} {'legacy/req':>14} {'warm-up':>12} {'cached/req':>14} {'speedup':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_dataset(directory, size, paid_ratio=1)
+            legacy_ids = [random.randint(1, size) for _ in range(max(3, 100_000 // size))]
+            legacy = measure(lambda pid: legacy_request(paths, pid), legacy_ids)
+
+            start = time.perf_counter()
+            tables = (
+                CSVTable(paths['participants'], ['id', 'name', 'email', 'session', 'registration_date']),
+                CSVTable(paths['sessions'], ['id', 'name', 'date', 'capacity', 'price']),
+                CSVTable(paths['payments'], ['id', 'participant_id', 'amount', 'payment_date', 'status'],
+                         indexes=['participant_id']),
+            )
+            for table in tables:
+                table.refresh()
+            warm_up = time.perf_counter() - start
+
+            cached_ids = [random.randint(1, size) for _ in range(10_000)]
+            cached = measure(lambda pid: cached_request(tables, pid), cached_ids)
+            print(f'{size:>12} {legacy * 1e3:>11.2f} ms {warm_up:>10.2f} s {cached * 1e6:>11.2f} us {legacy / cached:>9.0f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,66 @@
+"""Time participant search queries against a large in-memory index
+
+Builds a ParticipantIndex over synthetic participants with varied names,
+then reports build time, the latency of prefix, substring and missing
+queries, and the cost of incremental put()/discard().
+
+    python -m benchmarks.bench_search [PARTICIPANTS]
+"""
+import random
+import statistics
+import sys
+import time
+
+from search import ParticipantIndex
+
+DEFAULT_PARTICIPANTS = 1_000_000
+
+FIRST_NAMES = ['Amina', 'Basma', 'Carlos', 'Chen', 'David', 'Emma', 'Fatima', 'Hugo', 'Ines', 'James', 'Karim',
+               'Lea', 'Marta', 'Noah', 'Olga', 'Priya', 'Rania', 'Sofia', 'Tom', 'Yusuf']
+LAST_NAMES = ['Alami', 'Benali', 'Costa', 'Dubois', 'Evans', 'Garcia', 'Haddad', 'Ivanova', 'Johnson', 'Kumar',
+              'Lopez', 'Martin', 'Nguyen', 'Okafor', 'Petrov', 'Rossi', 'Schmidt', 'Tanaka', 'Wang', 'Zola']
+DOMAINS = ['example.com', 'mail.org', 'corp.io', 'uni.edu']
+
+
+def synthetic_participants(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        # A random suffix keeps the names and emails from collapsing into a few values
+        suffix = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(4))
+        yield {'id': str(i), 'name': f'{first} {last}{suffix}', 'email': f'{first}.{last}{suffix}{i}@{rng.choice(DOMAINS)}'}
+
+
+def time_queries(index, queries, repeat=50):
+    latencies = []
+    for query in queries:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            index.search(query)
+            latencies.append(time.perf_counter() - start)
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return f'p50 {cuts[49] * 1e6:.0f}us, p99 {cuts[98] * 1e6:.0f}us, max {max(latencies) * 1e6:.0f}us'
+
+
+def main(count):
+    participants = list(synthetic_participants(count))
+    start = time.perf_counter()
+    index = ParticipantIndex()
+    index.reset(participants)
+    print(f'built index of {len(index):,} participants in {time.perf_counter() - start:.1f}s')
+
+    sample = random.Random(1).sample(participants, 20)
+    print('prefix    ', time_queries(index, ['ba', 'garc', 'sofia ro', 'tom.w'] + [p['name'][:8] for p in sample]))
+    print('substring ', time_queries(index, ['ssi', 'anova', 'corp.io'] + [p['email'][3:12] for p in sample]))
+    print('no match  ', time_queries(index, ['qqqq', 'zzz@', 'xylophone']))
+
+    start = time.perf_counter()
+    for i, participant in enumerate(synthetic_participants(1000, seed=2), count + 1):
+        index.put(dict(participant, id=str(i)))
+    for i in range(count + 1, count + 1001):
+        index.discard(str(i))
+    print(f'put + discard: {(time.perf_counter() - start) / 1000 * 1e6:.0f}us per participant')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PARTICIPANTS)
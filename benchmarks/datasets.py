@@ -0,0 +1,61 @@
+"""Synthetic participants/sessions/payments CSV files"""
+import csv
+import os
+import random
+
+from storage import PARTICIPANT_FIELDS, PAYMENT_FIELDS, SESSION_FIELDS
+
+DEFAULT_SESSIONS = 20
+
+
+def write_dataset(directory, participants, sessions=DEFAULT_SESSIONS, paid_ratio=0.9, seed=0, capacity=None):
+    """Write participants.csv, sessions.csv and payments.csv into ``directory``
+
+    Session capacities are large enough for every participant (or
+    ``capacity`` when given), and roughly ``paid_ratio`` of the participants
+    get a completed payment. The same
+    arguments always produce the same files. Returns the paths by table name.
+    """
+    rng = random.Random(seed)
+    if capacity is None:
+        capacity = participants * 10 + 1000
+    os.makedirs(directory, exist_ok=True)
+    paths = {name: os.path.join(directory, f'{name}.csv') for name in ('participants', 'sessions', 'payments')}
+    with open(paths['sessions'], 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(SESSION_FIELDS)
+        for i in range(1, sessions + 1):
+            writer.writerow([i, f'Session {i}', f'2025-04-{i % 28 + 1:02d}', capacity, '99.99'])
+    with open(paths['participants'], 'w', newline='') as participants_file, \
+            open(paths['payments'], 'w', newline='') as payments_file:
+        participants_writer = csv.writer(participants_file)
+        payments_writer = csv.writer(payments_file)
+        participants_writer.writerow(PARTICIPANT_FIELDS)
+        payments_writer.writerow(PAYMENT_FIELDS)
+        payment_id = 0
+        for i in range(1, participants + 1):
+            date = f'2025-02-{rng.randint(1, 28):02d}'
+            participants_writer.writerow([i, f'Person {i}', f'person{i}@example.com', rng.randint(1, sessions), date])
+            if rng.random() < paid_ratio:
+                payment_id += 1
+                payments_writer.writerow([payment_id, i, '99.99', date, 'completed'])
+    return paths
+
+
+def prepare_app(directory, participants, seed=0, capacity=None):
+    """Write a dataset under ``directory`` and import the app on top of it
+
+    The app reads DATA_DIR when it is imported, so this can only be done
+    once per process. With STORAGE_BACKEND=sqlite the CSV dataset is
+    migrated into the database first.
+    """
+    data_dir = os.path.join(directory, 'data')
+    write_dataset(data_dir, participants, seed=seed, capacity=capacity)
+    os.environ['DATA_DIR'] = data_dir
+    os.environ.setdefault('SQLITE_DB', os.path.join(data_dir, 'conference.db'))
+    import app
+    if os.path.abspath(app.DATA_DIR) != os.path.abspath(data_dir):
+        raise RuntimeError('app was already imported with another DATA_DIR')
+    if app.STORAGE_BACKEND == 'sqlite':
+        app.storage.import_from(app.CSVStorage(app.PARTICIPANTS_CSV, app.SESSIONS_CSV, app.PAYMENTS_CSV))
+    return app
@@ -0,0 +1,92 @@
+"""Per-route latency and throughput through app.test_client()
+
+Each route is hit ``requests`` times, split across ``concurrency`` threads
+or forked processes, each with its own test client.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import random
+import statistics
+import time
+
+ROUTES = ['index', 'register', 'participants', 'success', 'certificate', 'stats']
+
+
+def _request(client, route, rng, ids, paid_ids, sessions):
+    if route == 'index':
+        return client.get('/')
+    if route == 'register':
+        n = rng.randrange(10 ** 9)
+        return client.post('/register', data={
+            'name': f'Load {n}', 'email': f'load{n}@example.com', 'session': rng.choice(sessions)
+        })
+    if route == 'participants':
+        return client.get(f'/participants?page={rng.randint(1, max(len(ids) // 50, 1))}')
+    if route == 'success':
+        return client.get(f'/success/{rng.choice(ids)}')
+    if route == 'certificate':
+        return client.get(f'/certificate/{rng.choice(paid_ids)}')
+    if route == 'stats':
+        return client.get(f'/sessions/{rng.choice(sessions)}/stats')
+    raise ValueError(f'Unknown route: {route}')
+
+
+def _worker(app, route, count, seed, ids, paid_ids, sessions):
+    """Send ``count`` requests and return (latencies in seconds, error count)"""
+    rng = random.Random(seed)
+    client = app.app.test_client()
+    latencies, errors = [], 0
+    for _ in range(count):
+        start = time.perf_counter()
+        response = _request(client, route, rng, ids, paid_ids, sessions)
+        latencies.append(time.perf_counter() - start)
+        errors += response.status_code >= 400
+    return latencies, errors
+
+
+def _process_worker(args):
+    import app
+    result = _worker(app, *args)
+    app.registration_queue.join()
+    return result
+
+
+def summarize(latencies, errors, elapsed):
+    """p50/p95/p99/mean latency in milliseconds and throughput in requests/s"""
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': cuts[49] * 1000,
+        'p95_ms': cuts[94] * 1000,
+        'p99_ms': cuts[98] * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'throughput_rps': len(latencies) / elapsed
+    }
+
+
+def run_route(app, route, requests=200, concurrency=1, mode='threads', seed=0):
+    """Drive one route and return its summary"""
+    ids = [p['id'] for p in app.get_participants()]
+    paid_ids = [p['participant_id'] for p in app.get_payments() if p['status'] == 'completed'] or ids
+    sessions = [s['id'] for s in app.get_sessions()]
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    jobs = [(route, share, seed * 1000 + i, ids, paid_ids, sessions) for i, share in enumerate(shares) if share]
+
+    start = time.perf_counter()
+    if mode == 'processes':
+        with multiprocessing.get_context('fork').Pool(len(jobs)) as pool:
+            results = pool.map(_process_worker, jobs)
+    else:
+        with ThreadPoolExecutor(len(jobs)) as pool:
+            results = list(pool.map(lambda job: _worker(app, *job), jobs))
+    # Throughput includes writing whatever ASYNC_REGISTRATION left queued
+    app.registration_queue.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+    return summarize(latencies, sum(errors for _, errors in results), elapsed)
+
+
+def run(app, routes=ROUTES, requests=200, concurrency=1, mode='threads', seed=0):
+    return {route: run_route(app, route, requests, concurrency, mode, seed) for route in routes}
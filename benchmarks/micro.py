@@ -0,0 +1,55 @@
+"""Micro-benchmarks of the storage helpers and certificate rendering"""
+import random
+import statistics
+import time
+
+from certificates import generate_certificate
+
+# Helpers that rewrite files or render images get fewer iterations
+SLOW_ITERATIONS = 50
+
+
+def measure(func, args_list):
+    """Call ``func`` once per argument tuple and summarize the timings in microseconds"""
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'iterations': len(timings),
+        'mean_us': statistics.fmean(timings) * 1e6,
+        'p50_us': timings[len(timings) // 2] * 1e6,
+        'p99_us': timings[min(int(len(timings) * 0.99), len(timings) - 1)] * 1e6
+    }
+
+
+def run(app, iterations=1000, seed=0):
+    """Benchmark get_participant, update_participant, delete_participant and generate_certificate"""
+    rng = random.Random(seed)
+    participants = app.get_participants()
+    ids = [p['id'] for p in participants]
+    slow = min(iterations, SLOW_ITERATIONS, len(ids) // 2)
+    results = {
+        'get_participant': measure(app.get_participant, [(rng.choice(ids),) for _ in range(iterations)])
+    }
+
+    updates = rng.sample(participants, slow)
+    results['update_participant'] = measure(
+        app.update_participant,
+        [(p['id'], f"{p['name']} (edited)", p['email'], p['session']) for p in updates]
+    )
+
+    # Delete participants that were not just updated
+    updated = {p['id'] for p in updates}
+    results['delete_participant'] = measure(
+        app.delete_participant,
+        [(participant_id,) for participant_id in rng.sample([i for i in ids if i not in updated], slow)]
+    )
+
+    results['generate_certificate'] = measure(
+        generate_certificate,
+        [(f'Person {i}', 'Session name', '2025-02-01') for i in range(min(iterations, SLOW_ITERATIONS))]
+    )
+    return results
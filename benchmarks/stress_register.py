@@ -0,0 +1,93 @@
+"""Concurrent registration stress check for the CSV storage
+
+Forks several processes that register participants against the same data
+files at once, then verifies that participant and payment ids are unique,
+every row is intact and every payment points at an existing participant.
+Exits with status 1 if anything is wrong. With CSV_APPEND_ONLY=1 the files
+are append-only logs and workers also compact them while others write.
+
+    python -m benchmarks.stress_register [PROCESSES] [REGISTRATIONS_PER_PROCESS]
+"""
+import csv
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from storage import PARTICIPANT_FIELDS, PAYMENT_FIELDS, CSVStorage
+
+APPEND_ONLY = os.environ.get('CSV_APPEND_ONLY') == '1'
+
+
+def create_files(directory):
+    paths = [os.path.join(directory, f'{name}.csv') for name in ('participants', 'sessions', 'payments')]
+    for path, header in zip(paths, [PARTICIPANT_FIELDS, ['id', 'name', 'date', 'capacity', 'price'], PAYMENT_FIELDS]):
+        with open(path, 'w', newline='') as f:
+            csv.writer(f).writerow(header)
+    return paths
+
+
+def worker(paths, worker_id, count):
+    storage = CSVStorage(*paths, append_only=APPEND_ONLY)
+    for i in range(count):
+        storage.register(f'Worker {worker_id} #{i}', f'w{worker_id}.{i}@example.com', '1', '9.99', '2025-01-01')
+        if i % 10 == 0:
+            # Mix in rewrites so appends race with atomic renames
+            storage.update_participant(1, 'Renamed', 'renamed@example.com', '1')
+        if APPEND_ONLY and i % 50 == 25:
+            storage.compact()
+
+
+def check(paths, expected):
+    errors = []
+    participants_csv, _, payments_csv = paths
+    for path, fields in ((participants_csv, PARTICIPANT_FIELDS), (payments_csv, PAYMENT_FIELDS)):
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            if next(reader) != fields:
+                errors.append(f'{path}: bad header')
+            rows = list(reader)
+        if APPEND_ONLY and path == participants_csv:
+            # Participant 1 is edited by appending new versions of it
+            rows = [row for row in rows if row[0] != '1'] + [row for row in rows if row[0] == '1'][:1]
+        ids = [row[0] for row in rows]
+        if len(rows) != expected:
+            errors.append(f'{path}: {len(rows)} rows, expected {expected}')
+        if len(set(ids)) != len(ids):
+            errors.append(f'{path}: {len(ids) - len(set(ids))} duplicate ids')
+        broken = [row for row in rows if len(row) != len(fields)]
+        if broken:
+            errors.append(f'{path}: {len(broken)} malformed rows, e.g. {broken[0]}')
+    storage = CSVStorage(*paths, append_only=APPEND_ONLY)
+    participant_ids = {p['id'] for p in storage.get_participants()}
+    orphans = [p for p in storage.get_payments() if p['participant_id'] not in participant_ids]
+    if orphans:
+        errors.append(f'{len(orphans)} payments without a participant')
+    return errors
+
+
+def main(processes=16, per_process=200):
+    context = multiprocessing.get_context('fork')
+    with tempfile.TemporaryDirectory() as directory:
+        paths = create_files(directory)
+        start = time.perf_counter()
+        workers = [context.Process(target=worker, args=(paths, n, per_process)) for n in range(processes)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - start
+        errors = check(paths, processes * per_process)
+        if any(process.exitcode for process in workers):
+            errors.append('a worker process failed')
+    print(f'{processes} processes x {per_process} registrations in {elapsed:.2f}s')
+    for error in errors:
+        print(f'FAIL: {error}')
+    if not errors:
+        print('OK: ids unique, rows intact')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:3]]))
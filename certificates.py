@@ -0,0 +1,398 @@
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+from io import BytesIO, RawIOBase
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import zipfile
+from PIL import Image, ImageDraw, ImageFont
+from reportlab.lib.colors import HexColor
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WIDTH = 1000
+HEIGHT = 700
+
+# Bump when the certificate design changes so cached PNGs are not reused
+TEMPLATE_VERSION = '2'
+
+FONT_PATHS = [
+    'arial.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/System/Library/Fonts/Helvetica.ttc',
+    'DejaVuSans.ttf'
+]
+
+def load_fonts():
+    """Find a working font and load it in the three certificate sizes"""
+    for font_path in FONT_PATHS:
+        try:
+            return {
+                'large': ImageFont.truetype(font_path, 48),
+                'medium': ImageFont.truetype(font_path, 36),
+                'small': ImageFont.truetype(font_path, 24)
+            }
+        except Exception:
+            continue
+
+    # Fallback to default if no fonts work
+    logger.warning("No TrueType font found for certificates, using the default bitmap font")
+    return {
+        'large': ImageFont.load_default(),
+        'medium': ImageFont.load_default(),
+        'small': ImageFont.load_default()
+    }
+
+def draw_centered(draw, x, y, text, fill, font):
+    """Draw text centered on (x, y)"""
+    try:
+        draw.text((x, y), text, fill=fill, font=font, anchor='mm')
+    except Exception:
+        # Fallback without anchor if it fails
+        text_width = font.getsize(text)[0]
+        draw.text((x - text_width/2, y), text, fill=fill, font=font)
+
+def render_background(fonts):
+    """Render the parts of the certificate that are the same for everyone"""
+    image = Image.new('RGB', (WIDTH, HEIGHT), 'white')
+    draw = ImageDraw.Draw(image)
+
+    # Draw border
+    draw.rectangle([(40, 40), (WIDTH-40, HEIGHT-40)], outline='#4F46E5', width=3)
+    draw.rectangle([(50, 50), (WIDTH-50, HEIGHT-50)], outline='#4F46E5', width=1)
+
+    static_text = [
+        (WIDTH/2, 150, 'Certificate of Completion', '#1F2937', fonts['large']),
+        (WIDTH/2, 250, 'This certifies that', '#4B5563', fonts['small']),
+        (WIDTH/2, 350, 'has successfully completed', '#4B5563', fonts['small'])
+    ]
+    for x, y, text, fill, font in static_text:
+        draw_centered(draw, x, y, text, fill, font)
+    return image
+
+# Resolved once at startup and shared by every request
+with metrics.certificate_phase('font_load'):
+    FONTS = load_fonts()
+BACKGROUND = render_background(FONTS)
+
+def generate_certificate(name, session_name, date):
+    """Generate a certificate as a PNG image"""
+    try:
+        metrics.count('certificate_renders')
+        with metrics.certificate_phase('draw'):
+            image = BACKGROUND.copy()
+            draw = ImageDraw.Draw(image)
+
+            # Draw the participant specific text
+            text_items = [
+                (WIDTH/2, 300, name, '#1F2937', FONTS['medium']),
+                (WIDTH/2, 400, session_name, '#1F2937', FONTS['medium']),
+                (WIDTH/2, 500, f'Date: {date}', '#4B5563', FONTS['small'])
+            ]
+            for x, y, text, fill, font in text_items:
+                draw_centered(draw, x, y, text, fill, font)
+
+        # Save to BytesIO
+        with metrics.certificate_phase('encode'):
+            img_io = BytesIO()
+            image.save(img_io, 'PNG')
+            img_io.seek(0)
+        return img_io
+    except Exception as e:
+        logger.error(f"Error generating certificate: {e}")
+        raise
+
+# PDF certificates: A4 landscape, drawn in the same 1000x700 layout as the PNG
+PDF_PAGE_SIZE = landscape(A4)
+PDF_SCALE = PDF_PAGE_SIZE[0] / WIDTH
+PDF_FONT_SIZES = {'large': 48, 'medium': 36, 'small': 24}
+PDF_BACKGROUND = 'certificate_background'
+
+# Drawn with no font embedded; covers the Windows-1252 (Western European) characters
+PDF_STANDARD_FONT = 'Helvetica'
+
+def register_pdf_font():
+    """Register a TrueType font with ReportLab once, falling back to Helvetica"""
+    for font_path in FONT_PATHS:
+        try:
+            pdfmetrics.registerFont(TTFont('CertificateSans', font_path))
+            return 'CertificateSans'
+        except Exception:
+            continue
+    return 'Helvetica'
+
+with metrics.certificate_phase('font_load', 'pdf'):
+    PDF_FONT = register_pdf_font()
+
+def _pdf_font(text):
+    """The standard font when it can draw ``text``, otherwise the TrueType one"""
+    # An embedded TrueType subset is ~20 KB; only names outside Windows-1252 need it
+    try:
+        text.encode('cp1252')
+    except UnicodeEncodeError:
+        return PDF_FONT
+    return PDF_STANDARD_FONT
+
+def _pdf_text(pdf, y, text, fill, size):
+    """Draw text centered on image coordinates (WIDTH/2, y)"""
+    pdf.setFillColor(HexColor(fill))
+    pdf.setFont(_pdf_font(text), PDF_FONT_SIZES[size])
+    # PDF y grows upwards from the baseline, PIL's 'mm' anchor is the text middle
+    pdf.drawCentredString(WIDTH/2, HEIGHT - y - PDF_FONT_SIZES[size] * 0.35, text)
+
+def new_certificate_pdf(output):
+    """Start a certificate PDF whose static design is defined once as a form XObject"""
+    pdf = canvas.Canvas(output, pagesize=PDF_PAGE_SIZE, pageCompression=1)
+    pdf.setTitle('Certificate of Completion')
+    pdf.beginForm(PDF_BACKGROUND)
+    pdf.scale(PDF_SCALE, PDF_SCALE)
+    pdf.setStrokeColor(HexColor('#4F46E5'))
+    pdf.setLineWidth(3)
+    pdf.rect(40, 40, WIDTH-80, HEIGHT-80)
+    pdf.setLineWidth(1)
+    pdf.rect(50, 50, WIDTH-100, HEIGHT-100)
+    _pdf_text(pdf, 150, 'Certificate of Completion', '#1F2937', 'large')
+    _pdf_text(pdf, 250, 'This certifies that', '#4B5563', 'small')
+    _pdf_text(pdf, 350, 'has successfully completed', '#4B5563', 'small')
+    pdf.endForm()
+    return pdf
+
+def add_certificate_page(pdf, name, session_name, date):
+    """Add one certificate page: the shared background plus the variable text"""
+    pdf.doForm(PDF_BACKGROUND)
+    pdf.scale(PDF_SCALE, PDF_SCALE)
+    _pdf_text(pdf, 300, name, '#1F2937', 'medium')
+    _pdf_text(pdf, 400, session_name, '#1F2937', 'medium')
+    _pdf_text(pdf, 500, f'Date: {date}', '#4B5563', 'small')
+    pdf.showPage()
+
+def generate_certificate_pdf(name, session_name, date):
+    """Generate a certificate as a vector PDF"""
+    try:
+        metrics.count('certificate_renders')
+        with metrics.certificate_phase('draw', 'pdf'):
+            pdf_io = BytesIO()
+            pdf = new_certificate_pdf(pdf_io)
+            add_certificate_page(pdf, name, session_name, date)
+        with metrics.certificate_phase('encode', 'pdf'):
+            pdf.save()
+            pdf_io.seek(0)
+        return pdf_io
+    except Exception as e:
+        logger.error(f"Error generating PDF certificate: {e}")
+        raise
+
+def write_certificates_pdf(jobs, output):
+    """Write one page per (name, session_name, date) job into a single PDF, page by page"""
+    pdf = new_certificate_pdf(output)
+    for name, session_name, date in jobs:
+        add_certificate_page(pdf, name, session_name, date)
+    pdf.save()
+
+CERTIFICATE_RENDERERS = {
+    'png': generate_certificate,
+    'pdf': generate_certificate_pdf
+}
+
+def certificate_etag(participant_id, name, session_name, date, fmt='png'):
+    """Stable identifier of a certificate's content, used as cache key and ETag"""
+    content = '\x1f'.join([TEMPLATE_VERSION, fmt, str(participant_id), name, session_name, date])
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+class CertificateCache:
+    """LRU cache of rendered certificates (PNG and PDF), backed by an optional directory
+
+    Entries are keyed by participant id and certificate_etag(), so a changed
+    name, session or date never hits a stale entry. invalidate() drops the
+    entries of a participant once their details change. On disk every
+    participant has a subdirectory holding at most one file per format:
+    storing a certificate removes the versions with other ETags, e.g. from
+    before a session rename or a TEMPLATE_VERSION bump.
+    """
+
+    def __init__(self, directory=None, max_entries=256):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _participant_dir(self, participant_id):
+        return os.path.join(self.directory, str(participant_id))
+
+    def get(self, participant_id, etag, fmt='png'):
+        """Return the cached certificate bytes, or None"""
+        key = (str(participant_id), etag)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self.directory:
+            try:
+                with open(os.path.join(self._participant_dir(participant_id), f'{fmt}-{etag}'), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+            self._remember(key, data)
+            return data
+        return None
+
+    def put(self, participant_id, etag, data, fmt='png'):
+        """Store rendered certificate bytes, replacing older versions of the same format"""
+        self._remember((str(participant_id), etag), data)
+        if self.directory:
+            try:
+                self._write(participant_id, fmt, etag, data)
+            except OSError as e:
+                # The copy in memory still serves this process
+                logger.warning(f"Could not store certificate of participant {participant_id}: {e}")
+
+    def _write(self, participant_id, fmt, etag, data):
+        directory = self._participant_dir(participant_id)
+        filename = f'{fmt}-{etag}'
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f'.{filename}.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(directory, filename))
+        for name in os.listdir(directory):
+            if name.startswith(f'{fmt}-') and name != filename:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, participant_id):
+        """Forget every cached certificate of a participant"""
+        participant_id = str(participant_id)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == participant_id]:
+                del self._entries[key]
+        if self.directory:
+            shutil.rmtree(self._participant_dir(participant_id), ignore_errors=True)
+
+    def get_or_render(self, participant_id, name, session_name, date, fmt='png'):
+        """Return (etag, bytes), rendering and caching the certificate on a miss"""
+        etag = certificate_etag(participant_id, name, session_name, date, fmt)
+        data = self.get(participant_id, etag, fmt)
+        if data is None:
+            data = CERTIFICATE_RENDERERS[fmt](name, session_name, date).getvalue()
+            self.put(participant_id, etag, data, fmt)
+        return etag, data
+
+def render_certificate_png(job):
+    """Render one (arcname, name, session_name, date) job; runs in a worker process"""
+    arcname, name, session_name, date = job
+    return arcname, generate_certificate(name, session_name, date).getvalue()
+
+# Render pools shared by every request, keyed by (process id, worker count)
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool_context():
+    # Forking a multi-threaded server can copy a lock held by another thread
+    # (logging, metrics) into the child, which then hangs on it forever
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    # The default preload runs the parent's __main__ (app.py, with its storage
+    # and background threads) inside the forkserver; workers only need this
+    context.set_forkserver_preload(['certificates'])
+    return context
+
+def _render_pool(max_workers):
+    """The process pool rendering certificates, created on first use"""
+    # A pool inherited through fork() is unusable, so each process has its own
+    key = (os.getpid(), max_workers)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ProcessPoolExecutor(max_workers=max_workers, mp_context=_pool_context())
+        return pool
+
+def _discard_pool(pool):
+    with _pools_lock:
+        for key in [key for key, value in _pools.items() if value is pool]:
+            del _pools[key]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _render_unordered(pool, jobs, window):
+    """Yield rendered jobs as they finish, with at most ``window`` in flight"""
+    pending = set()
+    try:
+        for job in jobs:
+            pending.add(pool.submit(render_certificate_png, job))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        # The pool outlives the request: drop the work of a download that was abandoned
+        for future in pending:
+            future.cancel()
+
+class _ChunkBuffer(RawIOBase):
+    """Unseekable sink for ZipFile whose contents are handed out by drain()"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def iter_certificates_zip(jobs, max_workers=None):
+    """Render certificate jobs in a process pool and yield a ZIP archive chunk by chunk
+
+    ``jobs`` is an iterable of (arcname, name, session_name, date). Only a
+    few jobs per worker are in flight at a time and every finished PNG is
+    written out immediately, so memory does not grow with the cohort size.
+    The pool is started once per process (forkserver, or spawn where that
+    is missing) and reused by later calls.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    buffer = _ChunkBuffer()
+    # PNGs are already compressed, deflating them again only costs CPU
+    archive = zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED)
+    pool = _render_pool(max_workers)
+    try:
+        for arcname, png in _render_unordered(pool, jobs, window=max_workers * 4):
+            archive.writestr(arcname, png)
+            yield buffer.drain()
+    except BrokenProcessPool:
+        # A worker died; the next download starts a fresh pool
+        _discard_pool(pool)
+        raise
+    archive.close()
+    yield buffer.drain()
@@ -0,0 +1,118 @@
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+
+# Counters recorded by the storage layer and the certificate renderer
+STORAGE_COUNTERS = ['file_opens', 'bytes_read', 'rows_parsed', 'bytes_written', 'queries']
+REQUEST_COUNTERS = STORAGE_COUNTERS + ['certificate_renders']
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Cumulative histogram in the Prometheus sense: bucket counts, sum and count"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Yield (upper bound, count of observations <= bound), ending with +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+_lock = threading.Lock()
+_totals = Counter()
+_request_latency = {}
+_certificate_phases = {}
+
+# Counters of the request being handled in the current thread/context, or None
+_request_stats = ContextVar('request_stats', default=None)
+
+def count(name, value=1):
+    """Add ``value`` to a counter, both process-wide and for the current request"""
+    with _lock:
+        _totals[name] += value
+    stats = _request_stats.get()
+    if stats is not None:
+        stats[name] += value
+
+def record_storage(**counters):
+    """Record storage I/O, e.g. record_storage(file_opens=1, bytes_read=1024)"""
+    for name, value in counters.items():
+        if value:
+            count(name, value)
+
+def start_request():
+    """Start collecting counters for the request handled in this context"""
+    stats = Counter()
+    _request_stats.set(stats)
+    return stats
+
+def finish_request():
+    """Stop collecting and return the counters of the current request"""
+    stats = _request_stats.get()
+    _request_stats.set(None)
+    return stats if stats is not None else Counter()
+
+def observe_request(route, method, status, seconds):
+    """Record the latency of one request"""
+    key = (route, method, str(status))
+    with _lock:
+        _request_latency.setdefault(key, Histogram()).observe(seconds)
+
+@contextmanager
+def certificate_phase(phase, fmt='png'):
+    """Time one phase (font_load, draw, encode) of certificate rendering"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _certificate_phases.setdefault((phase, fmt), Histogram()).observe(elapsed)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+def _histogram_lines(name, histograms, label_names):
+    for key, histogram in sorted(histograms.items()):
+        labels = dict(zip(label_names, key))
+        for bound, total in histogram.cumulative():
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f'{name}_bucket{{{_labels(**labels, le=le)}}} {total}'
+        yield f'{name}_sum{{{_labels(**labels)}}} {histogram.sum}'
+        yield f'{name}_count{{{_labels(**labels)}}} {histogram.count}'
+
+def render_prometheus():
+    """All metrics of this process in the Prometheus text exposition format"""
+    with _lock:
+        totals = dict(_totals)
+        latency = dict(_request_latency)
+        phases = dict(_certificate_phases)
+        lines = [
+            '# HELP app_request_duration_seconds Time spent handling a request, by route.',
+            '# TYPE app_request_duration_seconds histogram',
+            *_histogram_lines('app_request_duration_seconds', latency, ('route', 'method', 'status')),
+            '# HELP app_certificate_phase_seconds Time spent in each certificate rendering phase.',
+            '# TYPE app_certificate_phase_seconds histogram',
+            *_histogram_lines('app_certificate_phase_seconds', phases, ('phase', 'format')),
+        ]
+    for name in REQUEST_COUNTERS:
+        lines.append(f'# TYPE app_{name}_total counter')
+        lines.append(f'app_{name}_total {totals.get(name, 0)}')
+    return '\n'.join(lines) + '\n'
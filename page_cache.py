@@ -0,0 +1,37 @@
+from collections import OrderedDict
+import threading
+
+class PageCache:
+    """In-process LRU cache of rendered pages and template fragments
+
+    Every entry remembers the data version it was rendered from, so a
+    lookup with another version renders again; writes made by other
+    processes therefore never serve stale HTML. Write helpers of this
+    process also call invalidate() so the memory is released at once.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, version, render):
+        """Return the HTML cached under ``key`` for ``version``, calling ``render()`` on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+        # Rendered outside the lock; concurrent misses just render twice
+        html = render()
+        with self._lock:
+            self._entries[key] = (version, html)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def invalidate(self):
+        """Forget every cached page and fragment"""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,165 @@
+from collections import Counter, OrderedDict
+import logging
+import os
+import queue
+import threading
+
+from storage import SessionFullError
+
+logger = logging.getLogger(__name__)
+
+# Sentinel telling the writer thread to stop
+_STOP = object()
+
+class RegistrationQueue:
+    """Single background writer that records registrations in batches
+
+    submit() only holds a seat and hands out a participant id, then queues the
+    registration. Ids are reserved from storage ``id_block`` at a time, so
+    most submissions touch no file at all; ids left over when the process
+    exits are simply never used. The writer thread takes everything
+    waiting in the queue and hands it to storage.register_many() at once, so
+    a burst of sign-ups costs one locked, fsynced append per file instead of
+    one per registration. The queue is bounded: when it is full, submit()
+    waits for room and finally writes the registration itself.
+    """
+
+    def __init__(self, storage, maxsize=10000, max_batch=500, linger=0.005, put_timeout=5.0,
+                 max_failures=10000, id_block=64):
+        self.storage = storage
+        self.id_block = id_block
+        self.max_batch = max_batch
+        self.linger = linger
+        self.put_timeout = put_timeout
+        self.max_failures = max_failures
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pending_seats = Counter()
+        self._failures = OrderedDict()
+        # Bumped whenever the pending seats change, for pages that show them
+        self.version = 0
+        self._ids = iter(())
+        self._ids_pid = None
+        self._ids_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Threads do not survive fork(), so every worker process starts its own writer
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='registration-writer', daemon=True)
+            self._thread.start()
+
+    def _next_id(self):
+        with self._ids_lock:
+            # A forked worker must not hand out the ids left in its parent's block
+            participant_id = next(self._ids, None) if self._ids_pid == os.getpid() else None
+            if participant_id is None:
+                self._ids_pid = os.getpid()
+                first = self.storage.reserve_participant_ids(self.id_block)
+                self._ids = iter(range(first + 1, first + self.id_block))
+                participant_id = first
+            return str(participant_id)
+
+    def submit(self, registration, capacity=None, occupied=0):
+        """Queue a (name, email, session, amount, registration_date) registration
+
+        ``occupied`` is the number of seats already written for the session;
+        the queued registrations are added to it before comparing with
+        ``capacity``. Returns the reserved participant id, or raises
+        SessionFullError.
+        """
+        session = registration[2]
+        with self._lock:
+            if capacity is not None and occupied + self._pending_seats[session] >= capacity:
+                raise SessionFullError(session)
+            self._pending_seats[session] += 1
+            self.version += 1
+        try:
+            participant_id = self._next_id()
+        except Exception:
+            with self._lock:
+                self._pending_seats[session] -= 1
+                self.version += 1
+            raise
+        with self._lock:
+            self._ensure_thread()
+            self._pending[participant_id] = registration
+        try:
+            self._queue.put((participant_id, registration), timeout=self.put_timeout)
+        except queue.Full:
+            logger.warning("Registration queue is full, writing registration %s directly", participant_id)
+            self._write([(participant_id, registration)])
+        return participant_id
+
+    def pending_seats(self, session_id):
+        """Number of queued registrations for a session that are not written yet"""
+        with self._lock:
+            return self._pending_seats[str(session_id)]
+
+    def status(self, participant_id):
+        """'pending' while queued, an error message if the write failed, otherwise None"""
+        participant_id = str(participant_id)
+        with self._lock:
+            if participant_id in self._pending:
+                return 'pending'
+            return self._failures.get(participant_id)
+
+    def _next_batch(self):
+        item = self._queue.get()
+        batch = [item]
+        # Give concurrent requests a moment to join the batch, then take what is waiting
+        while len(batch) < self.max_batch and batch[-1] is not _STOP:
+            try:
+                batch.append(self._queue.get(timeout=self.linger) if len(batch) == 1 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch):
+        participant_ids = [participant_id for participant_id, _ in batch]
+        registrations = [registration for _, registration in batch]
+        try:
+            written = self.storage.register_many(registrations, participant_ids=participant_ids)
+            errors = [None if result is not None else f"Session {registration[2]} is full"
+                      for result, registration in zip(written, registrations)]
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} queued registrations: {e}")
+            errors = ['Registration could not be saved'] * len(batch)
+        with self._lock:
+            for participant_id, registration, error in zip(participant_ids, registrations, errors):
+                self._pending.pop(participant_id, None)
+                self._pending_seats[registration[2]] -= 1
+                if error:
+                    self._failures[participant_id] = error
+            while len(self._failures) > self.max_failures:
+                self._failures.popitem(last=False)
+            self._pending_seats += Counter()
+            self.version += 1
+
+    def join(self):
+        """Wait until every queued registration has been written"""
+        self._queue.join()
+
+    def close(self):
+        """Write what is still queued and stop the writer thread"""
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join()
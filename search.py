@@ -0,0 +1,189 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+import threading
+
+# Substring queries shorter than this only match by prefix
+NGRAM = 3
+
+# Keys added since the last merge are kept apart until there are this many,
+# or 1/64th of the main key array, whichever is larger
+MIN_MERGE_KEYS = 1024
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+def _normalize(text):
+    return ' '.join(text.casefold().split())
+
+def _document_text(participant):
+    return f"{_normalize(participant.get('name') or '')}\x1f{_normalize(participant.get('email') or '')}"
+
+def _prefix_keys(text):
+    """The name, every later word of the name, and the email of a document text"""
+    name, email = text.split('\x1f', 1)
+    words = name.split()
+    keys = {' '.join(words[i:]) for i in range(len(words))}
+    if email:
+        keys.add(email)
+    return keys
+
+def _merge_sorted(keys, docs, new_keys, new_docs):
+    """Merge a small sorted key/doc array into a large one with slice copies"""
+    merged_keys, merged_docs, start = [], [], 0
+    for key, doc in zip(new_keys, new_docs):
+        position = bisect_right(keys, key, start)
+        merged_keys.extend(keys[start:position])
+        merged_docs.extend(docs[start:position])
+        merged_keys.append(key)
+        merged_docs.append(doc)
+        start = position
+    merged_keys.extend(keys[start:])
+    merged_docs.extend(docs[start:])
+    return merged_keys, merged_docs
+
+class ParticipantIndex:
+    """In-memory name/email search over participants
+
+    Two structures serve a query:
+
+    - a sorted array of case-folded keys (the name, every later word of the
+      name, and the email) searched with bisect for prefix matches;
+    - an n-gram inverted index mapping every NGRAM-character slice of the
+      normalized name and email to the documents containing it, for
+      substring matches. Only the shortest posting list of the query's
+      n-grams is scanned and each candidate is checked against its text.
+
+    Participants are stored as numbered documents. put() adds a document
+    and keeps its keys in a small sorted array that is merged into the main
+    one in batches; discard() only marks the document dead. Dead documents
+    are skipped by queries and dropped once they outnumber the live ones.
+    The index listens to storage (see Storage.watch_participants) and is
+    only rebuilt from scratch when the storage has to start over, e.g. after
+    another process rewrote the CSV.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._watch_lock = threading.Lock()
+        self._storage = None
+        self.reset([])
+
+    def sync(self, storage):
+        """Start watching ``storage`` on first use, later pick up changes made elsewhere"""
+        # Separate from _lock: storage calls put()/discard() while holding its own locks
+        with self._watch_lock:
+            if self._storage is not storage:
+                storage.watch_participants(self)
+                self._storage = storage
+                return
+        storage.refresh_participants()
+
+    def reset(self, participants):
+        """Rebuild the index from every participant row"""
+        with self._lock:
+            self._ids = []
+            self._texts = []
+            self._docs = {}
+            self._postings = defaultdict(lambda: array('I'))
+            self._new_keys = []
+            self._new_key_docs = []
+            keyed = []
+            for participant in participants:
+                doc = self._add_document(participant)
+                keyed.extend((key, doc) for key in _prefix_keys(self._texts[doc]))
+            # One sort instead of an insertion per key
+            keyed.sort()
+            self._keys = [key for key, _ in keyed]
+            self._key_docs = [doc for _, doc in keyed]
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _add_document(self, participant):
+        """Store a participant as a new document and index its n-grams"""
+        doc = len(self._ids)
+        text = _document_text(participant)
+        self._ids.append(str(participant['id']))
+        self._texts.append(text)
+        self._docs[self._ids[doc]] = doc
+        postings = self._postings
+        for gram in _ngrams(text):
+            postings[gram].append(doc)
+        return doc
+
+    def put(self, participant):
+        """Add a participant, or replace the indexed version of it"""
+        with self._lock:
+            self._discard(str(participant['id']))
+            doc = self._add_document(participant)
+            for key in _prefix_keys(self._texts[doc]):
+                position = bisect_right(self._new_keys, key)
+                self._new_keys.insert(position, key)
+                self._new_key_docs.insert(position, doc)
+            if len(self._new_keys) >= max(MIN_MERGE_KEYS, len(self._keys) // 64):
+                self._keys, self._key_docs = _merge_sorted(
+                    self._keys, self._key_docs, self._new_keys, self._new_key_docs)
+                self._new_keys, self._new_key_docs = [], []
+            self._compact_if_needed()
+
+    def discard(self, participant_id):
+        """Remove a participant if it is indexed"""
+        with self._lock:
+            self._discard(str(participant_id))
+            self._compact_if_needed()
+
+    def _discard(self, participant_id):
+        doc = self._docs.pop(participant_id, None)
+        if doc is not None:
+            self._ids[doc] = None
+            self._texts[doc] = None
+
+    def _compact_if_needed(self):
+        """Renumber the live documents once dead ones outnumber them"""
+        if len(self._ids) - len(self._docs) > max(len(self._docs), MIN_MERGE_KEYS):
+            self.reset([
+                dict(zip(('name', 'email'), self._texts[doc].split('\x1f', 1)), id=self._ids[doc])
+                for doc in sorted(self._docs.values())
+            ])
+
+    def _prefix_matches(self, keys, docs, query, limit):
+        """(key, doc) pairs of up to ``limit`` live documents with a key starting with ``query``"""
+        matches, seen = [], set()
+        position = bisect_left(keys, query)
+        while position < len(keys) and len(seen) < limit and keys[position].startswith(query):
+            doc = docs[position]
+            if self._texts[doc] is not None and doc not in seen:
+                seen.add(doc)
+                matches.append((keys[position], doc))
+            position += 1
+        return matches
+
+    def search(self, query, limit=20):
+        """Ids of the participants whose name or email starts with or contains ``query``
+
+        Prefix matches come first, in key order, followed by substring
+        matches. At most ``limit`` ids are returned.
+        """
+        query = _normalize(query)
+        if not query or limit <= 0:
+            return []
+        with self._lock:
+            found = {}
+            prefix = sorted(self._prefix_matches(self._keys, self._key_docs, query, limit)
+                            + self._prefix_matches(self._new_keys, self._new_key_docs, query, limit))
+            for _, doc in prefix:
+                found.setdefault(doc, None)
+                if len(found) >= limit:
+                    break
+
+            if len(found) < limit and len(query) >= NGRAM:
+                postings = [self._postings.get(gram) for gram in _ngrams(query)]
+                if all(postings):
+                    for doc in min(postings, key=len):
+                        text = self._texts[doc]
+                        if text is not None and query in text and doc not in found:
+                            found[doc] = None
+                            if len(found) >= limit:
+                                break
+            return [self._ids[doc] for doc in found]
@@ -0,0 +1,1393 @@
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+import csv
+import fcntl
+import io
+from itertools import compress, islice
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+from analytics import SessionAggregates, session_stats_result
+import metrics
+
+
+@contextmanager
+def file_lock(path, mode=fcntl.LOCK_EX):
+    """Hold an fcntl lock on ``path`` (created if missing) for the duration of the block"""
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def atomic_file(path):
+    """Write to a temp file that replaces ``path`` only once it is complete and fsynced"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f'.{os.path.basename(path)}.')
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class CSVTable:
+    """Cached view of a CSV file, indexed by key and reloaded when the file changes
+
+    The file is parsed once into a dict keyed by ``key`` plus one dict per
+    secondary index (value -> {key: row}). Every read first compares the
+    file's mtime/size/inode with the values seen at load time, so writes made
+    by another process are picked up, while lookups on a warm cache never
+    touch the CSV parser. Rows handed out by the table are shared with the
+    cache and must be copied before being modified.
+
+    Writers serialize on an fcntl lock file next to the CSV, so several
+    worker processes can share the files: appends are fsynced in one write,
+    rewrites go through a temp file and an atomic rename, and new ids come
+    from a persisted counter (``<file>.seq``) instead of the row count.
+
+    When another process only appended, a reload parses just the bytes past
+    the offset already read; any other change parses the whole file again.
+    The file a cache was loaded from stays open, so the shortcut is only
+    taken while the path still names that very file (inode numbers of
+    replaced files get reused).
+
+    With ``append_only`` the file is a log: a row whose key was seen before
+    is a newer version of it, and a row with only the key filled in is a
+    tombstone deleting it. Edits and deletes are then single appends, so
+    the file only grows between compactions. compact() rewrites the file
+    with the live rows.
+    """
+
+    def __init__(self, path, fieldnames, key='id', indexes=(), append_only=False):
+        self.path = path
+        self.lock_path = f'{path}.lock'
+        self.seq_path = f'{path}.seq'
+        self.fieldnames = list(fieldnames)
+        self.key = key
+        self.index_fields = tuple(indexes)
+        self.append_only = append_only
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._stamp = None
+        # The file the cache was loaded from, held open (see _reopen())
+        self._fd = None
+        self._rows = {}
+        self._indexes = {field: {} for field in self.index_fields}
+        self._records = 0
+        # Keys in file order for positional reads, rebuilt lazily after a delete
+        self._order = None
+        self._listeners = []
+        # Listener calls wait here, in order, until the table locks are released
+        self._events = []
+        self._deliver_lock = threading.Lock()
+        self._held = threading.local()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _index(self, row):
+        for field in self.index_fields:
+            self._indexes[field].setdefault(row.get(field), {})[row[self.key]] = row
+
+    def _unindex(self, row):
+        for field in self.index_fields:
+            bucket = self._indexes[field].get(row.get(field))
+            if bucket is not None:
+                bucket.pop(row[self.key], None)
+                if not bucket:
+                    del self._indexes[field][row.get(field)]
+
+    def _is_tombstone(self, row):
+        return not any(row.get(field) for field in self.fieldnames if field != self.key)
+
+    def _apply(self, row):
+        """Make a log record the current version of its key; returns the live row or None"""
+        key = row[self.key]
+        old = self._rows.get(key)
+        if old is not None:
+            self._unindex(old)
+        if self._is_tombstone(row):
+            if self._rows.pop(key, None) is not None:
+                self._order = None
+            return None
+        # An existing key keeps its place in the dict, i.e. its first position in the file
+        if old is None and self._order is not None:
+            self._order.append(key)
+        self._rows[key] = row
+        self._index(row)
+        return row
+
+    def _apply_record(self, row):
+        """_apply() a log record and pass the change on to the listeners"""
+        live = self._apply(row)
+        if live is None:
+            self._emit('discard', row[self.key])
+        else:
+            self._emit('put', live)
+
+    def _add_row(self, row):
+        """Add a row whose key is new (plain files keep the first row of a key)"""
+        if row[self.key] in self._rows:
+            return
+        self._rows[row[self.key]] = row
+        self._index(row)
+        if self._order is not None:
+            self._order.append(row[self.key])
+        self._emit('put', row)
+
+    def _emit(self, method, arg, listeners=None):
+        """Queue ``listener.<method>(arg)`` for delivery once the table locks are released"""
+        listeners = tuple(self._listeners if listeners is None else listeners)
+        if listeners:
+            self._events.append((listeners, method, arg))
+
+    def _deliver(self):
+        """Hand the queued events to the listeners, in order, holding no table lock
+
+        One thread delivers at a time. The others leave their events to it
+        instead of waiting, e.g. while it rebuilds a listener after a reload.
+        """
+        while self._events:
+            if not self._deliver_lock.acquire(blocking=False):
+                return
+            try:
+                while True:
+                    with self._lock:
+                        events, self._events = self._events, []
+                    if not events:
+                        break
+                    for listeners, method, arg in events:
+                        for listener in listeners:
+                            getattr(listener, method)(arg)
+            finally:
+                self._deliver_lock.release()
+
+    @contextmanager
+    def _guard(self):
+        """Hold the table's thread lock, delivering queued events after the outermost release"""
+        depth = getattr(self._held, 'depth', 0)
+        self._held.depth = depth + 1
+        try:
+            with self._lock:
+                yield
+        finally:
+            self._held.depth = depth
+            if not depth:
+                self._deliver()
+
+    def _reset(self, rows):
+        self._rows = {}
+        self._indexes = {field: {} for field in self.index_fields}
+        self._records = 0
+        self._order = None
+        for row in rows:
+            self._records += 1
+            if self.append_only:
+                self._apply(row)
+                continue
+            key = row[self.key]
+            if key in self._rows:
+                # Keep the first row for duplicate keys, like a linear scan would
+                continue
+            self._rows[key] = row
+            self._index(row)
+
+    def _reopen(self):
+        """Hold the file now at ``path`` open and return its stamp (None if missing)
+
+        While we hold it, its inode cannot be given to another file, so a path
+        that still resolves to it is provably the file the cache was read from.
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        try:
+            self._fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        st = os.fstat(self._fd)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _only_grown(self, stamp):
+        """Whether the file at ``path`` is the loaded one with records appended to it"""
+        if self._fd is None or stamp is None or self._stamp is None or stamp[1] <= self._stamp[1]:
+            return False
+        try:
+            if not os.path.samestat(os.fstat(self._fd), os.stat(self.path)):
+                return False
+        except FileNotFoundError:
+            return False
+        # Everything read so far ended with a complete record
+        return self._stamp[1] == 0 or os.pread(self._fd, 1, self._stamp[1] - 1) == b'\n'
+
+    def _load_tail(self, stamp):
+        """Apply the records appended since the last load"""
+        data = os.pread(self._fd, stamp[1] - self._stamp[1], self._stamp[1])
+        rows = list(csv.DictReader(io.StringIO(data.decode('utf-8'), newline=''), fieldnames=self.fieldnames))
+        metrics.record_storage(bytes_read=len(data), rows_parsed=len(rows))
+        self._stamp = stamp
+        for row in rows:
+            self._records += 1
+            if self.append_only:
+                self._apply_record(row)
+            else:
+                self._add_row(row)
+
+    def _load(self):
+        stamp = self._stat()
+        if self._only_grown(stamp):
+            # Same file, only grown: another process appended
+            self._load_tail(stamp)
+            return
+        stamp = self._reopen()
+        if stamp is None:
+            self._reset([])
+        else:
+            with open(os.dup(self._fd), 'r', newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            self._reset(rows)
+            metrics.record_storage(file_opens=1, bytes_read=stamp[1], rows_parsed=len(rows))
+        self._stamp = stamp
+        if self._listeners:
+            self._emit('reset', list(self._rows.values()))
+
+    def watch(self, listener):
+        """Send the table to ``listener.reset(rows)`` now and after every full reload,
+        and each row that is added, changed or removed, here or by another
+        process that appended to the file, to ``listener.put(row)`` /
+        ``listener.discard(key)``
+
+        Listeners are called after the table's locks are released, so a slow
+        reset() never holds up writers.
+        """
+        with self._guard():
+            self.refresh()
+            self._listeners.append(listener)
+            self._emit('reset', list(self._rows.values()), [listener])
+
+    def refresh(self):
+        """Reload the table if the file changed since it was last read"""
+        if self._stat() != self._stamp:
+            with self._guard():
+                if self._lock_depth:
+                    # We hold the write lock already, nobody else can be writing
+                    self._load_if_changed()
+                else:
+                    # Shared lock so we never parse a half-written append
+                    with file_lock(self.lock_path, fcntl.LOCK_SH):
+                        self._load_if_changed()
+
+    def _load_if_changed(self):
+        # Threads that saw the same change queue up on the locks; only the
+        # first loads it, a reload by the others would reparse everything
+        if self._stat() != self._stamp:
+            self._load()
+
+    @contextmanager
+    def locked(self):
+        """Hold the table's inter-process write lock; re-entrant within a thread"""
+        with self._guard():
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with file_lock(self.lock_path):
+                self._lock_depth = 1
+                try:
+                    self.refresh()
+                    yield
+                finally:
+                    self._lock_depth = 0
+
+    def stamp(self):
+        """(mtime_ns, size, inode) of the file as it is now, or None if it is missing"""
+        return self._stat()
+
+    def __len__(self):
+        self.refresh()
+        return len(self._rows)
+
+    def rows(self):
+        """Return all rows in file order"""
+        self.refresh()
+        return list(self._rows.values())
+
+    def slice(self, offset, limit):
+        """Return up to ``limit`` rows in file order, starting at position ``offset``"""
+        self.refresh()
+        with self._guard():
+            if self._order is None:
+                self._order = list(self._rows)
+            return [self._rows[key] for key in self._order[offset:offset + limit]]
+
+    def get(self, key):
+        """Return the row with the given key, or None"""
+        self.refresh()
+        return self._rows.get(str(key))
+
+    def find(self, field, value):
+        """Return all rows whose indexed ``field`` equals ``value``"""
+        self.refresh()
+        return list(self._indexes[field].get(str(value), {}).values())
+
+    def first(self, field, value):
+        """Return the first row whose indexed ``field`` equals ``value``, or None"""
+        self.refresh()
+        bucket = self._indexes[field].get(str(value))
+        return next(iter(bucket.values())) if bucket else None
+
+    def index(self, field):
+        """The {value: {key: row}} mapping of the indexed ``field``, refreshed once
+
+        Meant for joins over many rows: lookups in the mapping skip the
+        per-call file check, and a full reload builds a new mapping instead
+        of changing this one, so another process rewriting the file midway
+        does not change what the caller sees. Do not modify it.
+        """
+        self.refresh()
+        return self._indexes[field]
+
+    def count(self, field, value):
+        """Number of rows whose indexed ``field`` equals ``value``"""
+        self.refresh()
+        return len(self._indexes[field].get(str(value), ()))
+
+    def counts(self, field):
+        """Number of rows per value of the indexed ``field``"""
+        self.refresh()
+        return {value: len(bucket) for value, bucket in self._indexes[field].items()}
+
+    def allocate_ids(self, count=1):
+        """Reserve ``count`` consecutive ids and return the first one"""
+        with self.locked():
+            try:
+                with open(self.seq_path, 'r') as f:
+                    last = int(f.read().strip() or 0)
+                metrics.record_storage(file_opens=1)
+            except FileNotFoundError:
+                last = max((int(key) for key in self._rows if key.isdigit()), default=0)
+            # Never hand out an id that is already in the file (e.g. rows added by hand)
+            while any(str(last + i) in self._rows for i in range(1, count + 1)):
+                last += 1
+            with atomic_file(self.seq_path) as f:
+                f.write(f'{last + count}\n')
+            metrics.record_storage(file_opens=1)
+            return last + 1
+
+    def last_allocated_id(self):
+        """The highest id handed out by allocate_ids() in any process, 0 if none was"""
+        try:
+            with open(self.seq_path, 'r') as f:
+                last = int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        metrics.record_storage(file_opens=1)
+        return last
+
+    def append_many(self, rows_values):
+        """Append rows to the file in a single fsynced write and add them to the cache"""
+        rows_values = list(rows_values)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows_values)
+        with self.locked():
+            with open(self.path, 'a', newline='', encoding='utf-8') as f:
+                f.write(buffer.getvalue())
+                f.flush()
+                os.fsync(f.fileno())
+            metrics.record_storage(file_opens=1, bytes_written=len(buffer.getvalue().encode('utf-8')))
+            rows = []
+            for values in rows_values:
+                row = {name: str(value) for name, value in zip(self.fieldnames, values)}
+                self._records += 1
+                if self.append_only:
+                    self._apply_record(row)
+                else:
+                    self._add_row(row)
+                rows.append(row)
+            self._stamp = self._stat()
+        return rows
+
+    def append(self, values):
+        """Append one row to the file and to the cache"""
+        return self.append_many([values])[0]
+
+    def delete_many(self, keys):
+        """Append a tombstone for every key (append-only tables)"""
+        if not self.append_only:
+            raise ValueError(f"{self.path} is not append-only")
+        blank = [''] * (len(self.fieldnames) - 1)
+        key_position = self.fieldnames.index(self.key)
+        self.append_many(blank[:key_position] + [key] + blank[key_position:] for key in keys)
+
+    def dead_ratio(self):
+        """Share of the file's records that are old versions or tombstones"""
+        self.refresh()
+        return (self._records - len(self._rows)) / self._records if self._records else 0.0
+
+    def compact(self):
+        """Rewrite the file with only the live version of every row"""
+        with self.locked():
+            self.rewrite(list(self._rows.values()))
+
+    def rewrite(self, rows):
+        """Atomically replace the whole file (and the cache) with ``rows``"""
+        with self.locked():
+            rows = [{name: row.get(name, '') for name in self.fieldnames} for row in rows]
+            with atomic_file(self.path) as f:
+                writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+                writer.writeheader()
+                writer.writerows(rows)
+            old_rows = self._rows
+            self._reset(rows)
+            self._stamp = self._reopen()
+            metrics.record_storage(file_opens=1, bytes_written=self._stamp[1])
+            if self._listeners:
+                self._notify_changes(old_rows)
+
+    def _notify_changes(self, old_rows):
+        """Tell the listeners which rows a rewrite removed, added or changed"""
+        for key in old_rows.keys() - self._rows.keys():
+            self._emit('discard', key)
+        for key, row in self._rows.items():
+            if old_rows.get(key) != row:
+                self._emit('put', row)
+
+
+PARTICIPANT_FIELDS = ['id', 'name', 'email', 'session', 'registration_date']
+SESSION_FIELDS = ['id', 'name', 'date', 'capacity', 'price']
+PAYMENT_FIELDS = ['id', 'participant_id', 'amount', 'payment_date', 'status']
+
+
+class SessionFullError(Exception):
+    """Raised when a registration would exceed a session's capacity"""
+
+    def __init__(self, session_id):
+        super().__init__(f"Session {session_id} is full")
+        self.session_id = session_id
+
+
+def session_capacity(session):
+    """Capacity of a session row as an int, or None when it is not limited"""
+    try:
+        return int(session['capacity'])
+    except (TypeError, KeyError, ValueError):
+        return None
+
+
+class Storage(ABC):
+    """Interface implemented by the storage backends
+
+    Every row is returned as a plain dict of strings, the way csv.DictReader
+    produces them, so templates and callers do not care which backend is used.
+    A backend missing one of the abstract methods fails when it is created.
+    """
+
+    @abstractmethod
+    def get_sessions(self):
+        ...
+
+    @abstractmethod
+    def get_session(self, session_id):
+        ...
+
+    @abstractmethod
+    def get_participants(self):
+        ...
+
+    @abstractmethod
+    def get_participant(self, participant_id):
+        ...
+
+    @abstractmethod
+    def get_payments(self):
+        ...
+
+    @abstractmethod
+    def get_participant_payment(self, participant_id):
+        ...
+
+    @abstractmethod
+    def add_participant(self, name, email, session, registration_date):
+        ...
+
+    @abstractmethod
+    def add_payment(self, participant_id, amount, payment_date, status='completed'):
+        ...
+
+    def register(self, name, email, session, amount, registration_date):
+        """Add a participant and its payment, returning both ids
+
+        Raises SessionFullError if the session has no seat left.
+        """
+        participant_id = self.add_participant(name, email, session, registration_date)
+        payment_id = self.add_payment(participant_id, amount, registration_date)
+        return participant_id, payment_id
+
+    @abstractmethod
+    def reserve_participant_ids(self, count=1):
+        """Reserve ``count`` consecutive participant ids for register_many() and return the first"""
+
+    @abstractmethod
+    def participant_id_reserved(self, participant_id):
+        """Whether ``participant_id`` was already handed out, by this process or another"""
+
+    @abstractmethod
+    def register_many(self, registrations, participant_ids=None):
+        """Register (name, email, session, amount, registration_date) tuples
+
+        ``participant_ids`` optionally gives ids obtained from
+        reserve_participant_ids(). Returns the participant ids in input order,
+        with None for the registrations refused because their session was full.
+        """
+
+    @abstractmethod
+    def update_participant(self, participant_id, name, email, session):
+        ...
+
+    @abstractmethod
+    def delete_participant(self, participant_id):
+        ...
+
+    @abstractmethod
+    def session_occupancy(self):
+        """Number of registered participants per session id"""
+
+    @abstractmethod
+    def data_version(self, tables):
+        """Version of the named tables ('participants', 'sessions', 'payments')
+
+        Returns (version, last_modified): an opaque string that changes
+        whenever any of the tables is written, and the time of the latest
+        write as a POSIX timestamp (None if unknown). Cheap enough to call
+        on every request.
+        """
+
+    def compact(self, threshold=0.0):
+        """Rewrite the data whose share of dead rows is above ``threshold``
+
+        Returns {table name: dead share before compaction} for the tables
+        that were compacted. Backends without dead rows do nothing.
+        """
+        return {}
+
+    @abstractmethod
+    def session_stats(self, session_id):
+        """Running totals of a session: registrations, paid/pending counts, revenue and registrations per day
+
+        Returns the dict built by analytics.session_stats_result(). The
+        totals are kept up to date on every write, so this costs the same
+        however many participants the session has.
+        """
+
+    @abstractmethod
+    def watch_participants(self, listener):
+        """Keep ``listener`` in step with the participants
+
+        ``listener.reset(rows)`` receives every participant now and whenever
+        the backend has to start over; ``listener.put(row)`` and
+        ``listener.discard(participant_id)`` receive single changes.
+        Changes made by other processes arrive on refresh_participants().
+        """
+
+    @abstractmethod
+    def refresh_participants(self):
+        """Deliver participant changes made elsewhere to the watchers"""
+
+    @abstractmethod
+    def iter_participants(self, session=None, status=None):
+        """Yield participants joined with their session name and payment"""
+
+    def list_participants(self, offset, limit, session=None, status=None):
+        """Return up to ``limit`` joined participants, skipping the first ``offset``"""
+        return list(islice(self.iter_participants(session, status), offset, offset + limit))
+
+
+def _join_payment(entry, session_name, payment):
+    entry['session_name'] = session_name
+    entry['payment_status'] = payment['status'] if payment else 'Pending'
+    if payment:
+        entry['payment_amount'] = payment['amount']
+    return entry
+
+
+class CSVStorage(Storage):
+    """Storage backed by the participants/sessions/payments CSV files
+
+    With ``append_only`` the participants and payments files are logs (see
+    CSVTable): an edit appends the new version of the row and a delete
+    appends tombstones, instead of rewriting the whole file. compact()
+    reclaims the dead rows. Switch the mode off only after compacting.
+    """
+
+    def __init__(self, participants_csv, sessions_csv, payments_csv, append_only=False):
+        self.append_only = append_only
+        self.participants = CSVTable(participants_csv, PARTICIPANT_FIELDS, indexes=['session'],
+                                     append_only=append_only)
+        self.sessions = CSVTable(sessions_csv, SESSION_FIELDS)
+        self.payments = CSVTable(payments_csv, PAYMENT_FIELDS, indexes=['participant_id'],
+                                 append_only=append_only)
+        self._aggregates = None
+        self._aggregates_lock = threading.Lock()
+
+    def get_sessions(self):
+        return [dict(s) for s in self.sessions.rows()]
+
+    def get_session(self, session_id):
+        session = self.sessions.get(session_id)
+        return dict(session) if session else None
+
+    def get_participants(self):
+        return [dict(p) for p in self.participants.rows()]
+
+    def get_participant(self, participant_id):
+        participant = self.participants.get(participant_id)
+        return dict(participant) if participant else None
+
+    def get_payments(self):
+        return [dict(p) for p in self.payments.rows()]
+
+    def get_participant_payment(self, participant_id):
+        payment = self.payments.first('participant_id', participant_id)
+        return dict(payment) if payment else None
+
+    def _check_seat(self, session, pending=0):
+        """Raise SessionFullError unless ``session`` has a seat beyond ``pending`` ones"""
+        capacity = session_capacity(self.sessions.get(session))
+        if capacity is not None and self.participants.count('session', session) + pending >= capacity:
+            raise SessionFullError(session)
+
+    # Lock order is always participants, then payments
+
+    def add_participant(self, name, email, session, registration_date):
+        with self.participants.locked():
+            self._check_seat(session)
+            participant_id = self.participants.allocate_ids()
+            self.participants.append([participant_id, name, email, session, registration_date])
+        return participant_id
+
+    def add_payment(self, participant_id, amount, payment_date, status='completed'):
+        with self.payments.locked():
+            payment_id = self.payments.allocate_ids()
+            self.payments.append([payment_id, participant_id, amount, payment_date, status])
+        return payment_id
+
+    def register(self, name, email, session, amount, registration_date):
+        with self.participants.locked(), self.payments.locked():
+            return super().register(name, email, session, amount, registration_date)
+
+    def reserve_participant_ids(self, count=1):
+        return self.participants.allocate_ids(count)
+
+    def participant_id_reserved(self, participant_id):
+        return int(participant_id) <= self.participants.last_allocated_id()
+
+    def register_many(self, registrations, participant_ids=None):
+        registrations = list(registrations)
+        if not registrations:
+            return []
+        with self.participants.locked(), self.payments.locked():
+            accepted, pending = [], Counter()
+            for registration in registrations:
+                session = str(registration[2])
+                try:
+                    self._check_seat(session, pending[session])
+                except SessionFullError:
+                    accepted.append(False)
+                    continue
+                pending[session] += 1
+                accepted.append(True)
+            batch = list(compress(registrations, accepted))
+            if not batch:
+                return [None] * len(registrations)
+
+            # One id block and one append per file for the whole batch
+            if participant_ids is None:
+                first_participant = self.participants.allocate_ids(len(batch))
+                batch_ids = list(range(first_participant, first_participant + len(batch)))
+            else:
+                batch_ids = list(compress(participant_ids, accepted))
+            first_payment = self.payments.allocate_ids(len(batch))
+            self.participants.append_many(
+                [participant_id, name, email, session, registration_date]
+                for participant_id, (name, email, session, _, registration_date)
+                in zip(batch_ids, batch)
+            )
+            self.payments.append_many(
+                [payment_id, participant_id, amount, registration_date, 'completed']
+                for payment_id, participant_id, (_, _, _, amount, registration_date)
+                in zip(range(first_payment, first_payment + len(batch)), batch_ids, batch)
+            )
+        batch_ids = iter(batch_ids)
+        return [next(batch_ids) if ok else None for ok in accepted]
+
+    def update_participant(self, participant_id, name, email, session):
+        with self.participants.locked():
+            participant = self.participants.get(participant_id)
+            if participant is None:
+                return False
+            if participant['session'] != str(session):
+                self._check_seat(session)
+            if self.append_only:
+                self.participants.append([participant_id, name, email, session, participant['registration_date']])
+                return True
+            changes = {'name': name, 'email': email, 'session': session}
+            self.participants.rewrite(
+                dict(p, **changes) if p['id'] == str(participant_id) else p
+                for p in self.participants.rows()
+            )
+        return True
+
+    def delete_participant(self, participant_id):
+        participant_id = str(participant_id)
+        with self.participants.locked(), self.payments.locked():
+            if self.append_only:
+                payment_ids = [p['id'] for p in self.payments.find('participant_id', participant_id)]
+                if payment_ids:
+                    self.payments.delete_many(payment_ids)
+                if self.participants.get(participant_id) is not None:
+                    self.participants.delete_many([participant_id])
+                return True
+            self.participants.rewrite(p for p in self.participants.rows() if p['id'] != participant_id)
+            self.payments.rewrite(p for p in self.payments.rows() if p['participant_id'] != participant_id)
+        return True
+
+    def session_occupancy(self):
+        # The session index already holds one bucket per session, kept current on every write
+        return self.participants.counts('session')
+
+    def data_version(self, tables):
+        # A stat per file: any append or atomic rewrite changes its mtime, size or inode
+        stamps = [getattr(self, table).stamp() for table in tables]
+        version = ';'.join('-' if stamp is None else '%x.%x.%x' % stamp for stamp in stamps)
+        modified = max((stamp[0] for stamp in stamps if stamp), default=None)
+        return version, None if modified is None else modified / 1e9
+
+    def compact(self, threshold=0.0):
+        compacted = {}
+        for name in ('participants', 'payments'):
+            table = getattr(self, name)
+            with table.locked():
+                ratio = table.dead_ratio()
+                if ratio > threshold:
+                    table.compact()
+                    compacted[name] = ratio
+        return compacted
+
+    def session_stats(self, session_id):
+        with self._aggregates_lock:
+            if self._aggregates is None:
+                # Built in one pass over both tables, then updated by every append or rewrite
+                aggregates = SessionAggregates()
+                self.participants.watch(aggregates.participant_feed)
+                self.payments.watch(aggregates.payment_feed)
+                self._aggregates = aggregates
+        # Picks up what other processes wrote since
+        self.participants.refresh()
+        self.payments.refresh()
+        return self._aggregates.stats(session_id)
+
+    def watch_participants(self, listener):
+        self.participants.watch(listener)
+
+    def refresh_participants(self):
+        # A reload after another process wrote the file resets the listeners
+        self.participants.refresh()
+
+    def _join_rows(self, rows, status=None):
+        """Join participant rows with their session name and first payment
+
+        The files are checked once, here; the rows are then joined lazily
+        against that snapshot, so a long export neither stat()s the payments
+        file per row nor sees it reparsed halfway through.
+        """
+        session_names = {s['id']: s['name'] for s in self.sessions.rows()}
+        payments = self.payments.index('participant_id')
+
+        def join():
+            for participant in rows:
+                bucket = payments.get(participant['id'])
+                payment = next(iter(bucket.values())) if bucket else None
+                paid = payment is not None and payment['status'] == 'completed'
+                if (status == 'completed' and not paid) or (status == 'pending' and paid):
+                    continue
+                yield _join_payment(dict(participant), session_names.get(participant['session'], ''), payment)
+        return join()
+
+    def iter_participants(self, session=None, status=None):
+        rows = self.participants.find('session', session) if session else self.participants.rows()
+        return self._join_rows(rows, status)
+
+    def list_participants(self, offset, limit, session=None, status=None):
+        if session or status:
+            return super().list_participants(offset, limit, session, status)
+        # Unfiltered pages are a positional slice, so a deep page costs what the first one does
+        return list(self._join_rows(self.participants.slice(offset, limit)))
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    date TEXT,
+    capacity INTEGER,
+    price REAL
+);
+CREATE TABLE IF NOT EXISTS participants (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    session INTEGER NOT NULL,
+    registration_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_participants_session ON participants (session);
+CREATE TABLE IF NOT EXISTS payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    participant_id INTEGER NOT NULL,
+    amount REAL,
+    payment_date TEXT,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_payments_participant_id ON payments (participant_id);
+CREATE TABLE IF NOT EXISTS session_seats (
+    session INTEGER PRIMARY KEY,
+    taken INTEGER NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS participants_seat_insert AFTER INSERT ON participants BEGIN
+    INSERT INTO session_seats (session, taken) VALUES (NEW.session, 1)
+    ON CONFLICT (session) DO UPDATE SET taken = taken + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS participants_seat_delete AFTER DELETE ON participants BEGIN
+    UPDATE session_seats SET taken = taken - 1 WHERE session = OLD.session;
+END;
+CREATE TRIGGER IF NOT EXISTS participants_seat_update AFTER UPDATE OF session ON participants
+WHEN NEW.session IS NOT OLD.session BEGIN
+    UPDATE session_seats SET taken = taken - 1 WHERE session = OLD.session;
+    INSERT INTO session_seats (session, taken) VALUES (NEW.session, 1)
+    ON CONFLICT (session) DO UPDATE SET taken = taken + 1;
+END;
+CREATE TABLE IF NOT EXISTS participant_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    participant_id INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS participants_change_insert AFTER INSERT ON participants BEGIN
+    INSERT INTO participant_changes (participant_id) VALUES (NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS participants_change_update AFTER UPDATE ON participants BEGIN
+    INSERT INTO participant_changes (participant_id) VALUES (NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS participants_change_delete AFTER DELETE ON participants BEGIN
+    INSERT INTO participant_changes (participant_id) VALUES (OLD.id);
+END;
+CREATE TRIGGER IF NOT EXISTS participant_changes_prune AFTER INSERT ON participant_changes
+WHEN NEW.seq % 1000 = 0 BEGIN
+    DELETE FROM participant_changes WHERE seq <= NEW.seq - 100000;
+END;
+CREATE TABLE IF NOT EXISTS table_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    modified REAL
+);
+INSERT OR IGNORE INTO table_versions (name, version, modified)
+VALUES ('database', abs(random()), (julianday('now') - 2440587.5) * 86400.0);
+""" + ''.join(f"""CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+    INSERT INTO table_versions (name, version, modified)
+    VALUES ('{table}', 1, (julianday('now') - 2440587.5) * 86400.0)
+    ON CONFLICT (name) DO UPDATE SET version = version + 1, modified = excluded.modified;
+END;
+""" for table in ('participants', 'sessions', 'payments') for event in ('INSERT', 'UPDATE', 'DELETE'))
+
+
+def _paid(participant_id, exclude=None):
+    """SQL: 1 if the participant has a completed payment (other than payment ``exclude``), else 0"""
+    other = f' AND id != {exclude}' if exclude else ''
+    return (f"EXISTS (SELECT 1 FROM payments WHERE participant_id = {participant_id} "
+            f"AND status = 'completed'{other})")
+
+
+def _revenue(participant_id):
+    """SQL: sum of the participant's completed payments"""
+    return (f"(SELECT COALESCE(SUM(amount), 0) FROM payments WHERE participant_id = {participant_id} "
+            f"AND status = 'completed')")
+
+
+def _count_participant(row, sign):
+    """SQL adding (sign='+') or removing (sign='-') a participant row's share of the session totals"""
+    if sign == '+':
+        return f"""    INSERT INTO session_stats (session, registrations, paid, revenue)
+    VALUES ({row}.session, 1, {_paid(f'{row}.id')}, {_revenue(f'{row}.id')})
+    ON CONFLICT (session) DO UPDATE SET registrations = registrations + 1,
+        paid = paid + excluded.paid, revenue = revenue + excluded.revenue;
+    INSERT INTO session_daily_registrations (session, day, registrations)
+    VALUES ({row}.session, COALESCE({row}.registration_date, ''), 1)
+    ON CONFLICT (session, day) DO UPDATE SET registrations = registrations + 1;
+"""
+    return f"""    UPDATE session_stats SET registrations = registrations - 1,
+        paid = paid - {_paid(f'{row}.id')}, revenue = revenue - {_revenue(f'{row}.id')}
+    WHERE session = {row}.session;
+    UPDATE session_daily_registrations SET registrations = registrations - 1
+    WHERE session = {row}.session AND day = COALESCE({row}.registration_date, '');
+"""
+
+
+def _count_payment(row, sign):
+    """SQL adding or removing a completed payment row's share of its participant's session totals"""
+    # The participant only turns paid (or pending) with their first (or last) completed payment
+    return f"""    UPDATE session_stats SET paid = paid {sign} (NOT {_paid(f'{row}.participant_id', f'{row}.id')}),
+        revenue = revenue {sign} COALESCE({row}.amount, 0)
+    WHERE session = (SELECT session FROM participants WHERE id = {row}.participant_id);
+"""
+
+
+SQLITE_STATS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS session_stats (
+    session INTEGER PRIMARY KEY,
+    registrations INTEGER NOT NULL DEFAULT 0,
+    paid INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS session_daily_registrations (
+    session INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    registrations INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (session, day)
+);
+CREATE TRIGGER IF NOT EXISTS participants_stats_insert AFTER INSERT ON participants BEGIN
+{_count_participant('NEW', '+')}END;
+CREATE TRIGGER IF NOT EXISTS participants_stats_delete AFTER DELETE ON participants BEGIN
+{_count_participant('OLD', '-')}END;
+CREATE TRIGGER IF NOT EXISTS participants_stats_update AFTER UPDATE OF id, session, registration_date ON participants
+WHEN NEW.id IS NOT OLD.id OR NEW.session IS NOT OLD.session
+    OR NEW.registration_date IS NOT OLD.registration_date BEGIN
+{_count_participant('OLD', '-')}{_count_participant('NEW', '+')}END;
+CREATE TRIGGER IF NOT EXISTS payments_stats_insert AFTER INSERT ON payments
+WHEN NEW.status = 'completed' BEGIN
+{_count_payment('NEW', '+')}END;
+CREATE TRIGGER IF NOT EXISTS payments_stats_delete AFTER DELETE ON payments
+WHEN OLD.status = 'completed' BEGIN
+{_count_payment('OLD', '-')}END;
+CREATE TRIGGER IF NOT EXISTS payments_stats_update_old AFTER UPDATE OF participant_id, amount, status ON payments
+WHEN OLD.status = 'completed' BEGIN
+{_count_payment('OLD', '-')}END;
+CREATE TRIGGER IF NOT EXISTS payments_stats_update_new AFTER UPDATE OF participant_id, amount, status ON payments
+WHEN NEW.status = 'completed' BEGIN
+{_count_payment('NEW', '+')}END;
+"""
+
+
+def _text_row(cursor, row):
+    """sqlite3 row factory returning rows the way csv.DictReader does"""
+    return {column[0]: '' if value is None else str(value) for column, value in zip(cursor.description, row)}
+
+
+def _null(value):
+    return None if value in ('', None) else value
+
+
+class SQLiteStorage(Storage):
+    """Storage backed by a SQLite database in WAL mode
+
+    participants.id and payments.id are INTEGER PRIMARY KEYs (the rowid
+    B-tree), and participants.session / payments.participant_id carry
+    secondary indexes, so lookups and writes are O(log N). WAL lets readers
+    keep going while a writer commits. Each thread gets its own connection.
+    Seats taken per session live in session_seats, kept current by triggers
+    and rebuilt when the storage is opened. Triggers also log the id of every
+    inserted, updated or deleted participant in participant_changes (the
+    last 100000 changes are kept), which is how participant watchers catch up,
+    and count the writes to every table in table_versions. The 'database' row
+    there holds a random number chosen when the file was created. Per-session
+    registration and payment totals (session_stats) and registrations per
+    day (session_daily_registrations) are kept by triggers and rebuilt on
+    open the same way as session_seats.
+    """
+
+    # Catching up on more changes than this rebuilds the watchers instead
+    MAX_CATCH_UP = 10000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._watch_lock = threading.Lock()
+        self._watchers = []
+        self._watched_seq = 0
+        self._connect().executescript(SQLITE_SCHEMA + SQLITE_STATS_SCHEMA)
+        with self._transaction() as conn:
+            self._rebuild_seats(conn)
+            self._rebuild_stats(conn)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = _text_row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run the block in one write transaction, taking the write lock up front"""
+        conn = self._connect()
+        metrics.record_storage(queries=1)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _rebuild_seats(self, conn):
+        conn.execute('DELETE FROM session_seats')
+        conn.execute(
+            'INSERT INTO session_seats (session, taken) SELECT session, COUNT(*) FROM participants GROUP BY session'
+        )
+
+    def _rebuild_stats(self, conn):
+        conn.execute('DELETE FROM session_stats')
+        conn.execute(
+            'INSERT INTO session_stats (session, registrations, paid, revenue) '
+            'SELECT p.session, COUNT(*), COUNT(pay.participant_id), COALESCE(SUM(pay.revenue), 0) '
+            'FROM participants p LEFT JOIN ('
+            "SELECT participant_id, SUM(COALESCE(amount, 0)) AS revenue FROM payments WHERE status = 'completed' "
+            'GROUP BY participant_id) pay ON pay.participant_id = p.id '
+            'GROUP BY p.session'
+        )
+        conn.execute('DELETE FROM session_daily_registrations')
+        conn.execute(
+            'INSERT INTO session_daily_registrations (session, day, registrations) '
+            "SELECT session, COALESCE(registration_date, ''), COUNT(*) FROM participants GROUP BY 1, 2"
+        )
+
+    def _free_seats(self, conn, session):
+        """Seats left in a session, or None when it is not limited"""
+        row = conn.execute(
+            'SELECT s.capacity, COALESCE(o.taken, 0) AS taken FROM sessions s '
+            'LEFT JOIN session_seats o ON o.session = s.id WHERE s.id = ?',
+            (session,)
+        ).fetchone()
+        capacity = session_capacity(row)
+        return None if capacity is None else capacity - int(row['taken'])
+
+    def _check_seat(self, conn, session):
+        free = self._free_seats(conn, session)
+        if free is not None and free <= 0:
+            raise SessionFullError(session)
+
+    def _execute(self, sql, params=()):
+        metrics.record_storage(queries=1)
+        return self._connect().execute(sql, params)
+
+    def _one(self, sql, params=()):
+        return self._execute(sql, params).fetchone()
+
+    def _all(self, sql, params=()):
+        return self._execute(sql, params).fetchall()
+
+    def get_sessions(self):
+        return self._all('SELECT id, name, date, capacity, price FROM sessions ORDER BY id')
+
+    def get_session(self, session_id):
+        return self._one('SELECT id, name, date, capacity, price FROM sessions WHERE id = ?', (session_id,))
+
+    def get_participants(self):
+        return self._all('SELECT id, name, email, session, registration_date FROM participants ORDER BY id')
+
+    def get_participant(self, participant_id):
+        return self._one(
+            'SELECT id, name, email, session, registration_date FROM participants WHERE id = ?',
+            (participant_id,)
+        )
+
+    def get_payments(self):
+        return self._all('SELECT id, participant_id, amount, payment_date, status FROM payments ORDER BY id')
+
+    def get_participant_payment(self, participant_id):
+        return self._one(
+            'SELECT id, participant_id, amount, payment_date, status FROM payments '
+            'WHERE participant_id = ? ORDER BY id LIMIT 1',
+            (participant_id,)
+        )
+
+    def _insert_participant(self, conn, name, email, session, registration_date):
+        return conn.execute(
+            'INSERT INTO participants (name, email, session, registration_date) VALUES (?, ?, ?, ?)',
+            (name, email, session, registration_date)
+        ).lastrowid
+
+    def _insert_payment(self, conn, participant_id, amount, payment_date, status):
+        return conn.execute(
+            'INSERT INTO payments (participant_id, amount, payment_date, status) VALUES (?, ?, ?, ?)',
+            (participant_id, amount, payment_date, status)
+        ).lastrowid
+
+    def add_participant(self, name, email, session, registration_date):
+        with self._transaction() as conn:
+            self._check_seat(conn, session)
+            return self._insert_participant(conn, name, email, session, registration_date)
+
+    def add_payment(self, participant_id, amount, payment_date, status='completed'):
+        with self._transaction() as conn:
+            return self._insert_payment(conn, participant_id, amount, payment_date, status)
+
+    def register(self, name, email, session, amount, registration_date):
+        with self._transaction() as conn:
+            self._check_seat(conn, session)
+            participant_id = self._insert_participant(conn, name, email, session, registration_date)
+            payment_id = self._insert_payment(conn, participant_id, amount, registration_date, 'completed')
+        return participant_id, payment_id
+
+    def _next_id(self, conn, table):
+        row = conn.execute(
+            f"SELECT MAX(COALESCE((SELECT MAX(id) FROM {table}), 0), "
+            f"COALESCE((SELECT seq FROM sqlite_sequence WHERE name = '{table}'), 0)) AS last_id"
+        ).fetchone()
+        return int(row['last_id']) + 1
+
+    def reserve_participant_ids(self, count=1):
+        with self._transaction() as conn:
+            first = self._next_id(conn, 'participants')
+            # Move the AUTOINCREMENT counter past the block so it is never handed out again
+            last = first + count - 1
+            if not conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'participants'", (last,)).rowcount:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('participants', ?)", (last,))
+        return first
+
+    def participant_id_reserved(self, participant_id):
+        metrics.record_storage(queries=1)
+        return int(participant_id) < self._next_id(self._connect(), 'participants')
+
+    def register_many(self, registrations, participant_ids=None):
+        registrations = list(registrations)
+        if not registrations:
+            return []
+        with self._transaction() as conn:
+            free = {}
+            accepted = []
+            for registration in registrations:
+                session = str(registration[2])
+                if session not in free:
+                    free[session] = self._free_seats(conn, session)
+                if free[session] is not None and free[session] <= 0:
+                    accepted.append(False)
+                    continue
+                if free[session] is not None:
+                    free[session] -= 1
+                accepted.append(True)
+            batch = list(compress(registrations, accepted))
+            if not batch:
+                return [None] * len(registrations)
+
+            # Ids are assigned up front so the batch can go through executemany
+            if participant_ids is None:
+                first_participant = self._next_id(conn, 'participants')
+                batch_ids = list(range(first_participant, first_participant + len(batch)))
+            else:
+                batch_ids = list(compress(participant_ids, accepted))
+            first_payment = self._next_id(conn, 'payments')
+            conn.executemany(
+                'INSERT INTO participants (id, name, email, session, registration_date) VALUES (?, ?, ?, ?, ?)',
+                ((participant_id, name, email, session, registration_date)
+                 for participant_id, (name, email, session, _, registration_date)
+                 in zip(batch_ids, batch))
+            )
+            conn.executemany(
+                'INSERT INTO payments (id, participant_id, amount, payment_date, status) VALUES (?, ?, ?, ?, ?)',
+                ((payment_id, participant_id, amount, registration_date, 'completed')
+                 for payment_id, participant_id, (_, _, _, amount, registration_date)
+                 in zip(range(first_payment, first_payment + len(batch)), batch_ids, batch))
+            )
+        batch_ids = iter(batch_ids)
+        return [next(batch_ids) if ok else None for ok in accepted]
+
+    def update_participant(self, participant_id, name, email, session):
+        with self._transaction() as conn:
+            current = conn.execute('SELECT session FROM participants WHERE id = ?', (participant_id,)).fetchone()
+            if current is None:
+                return False
+            if current['session'] != str(session):
+                self._check_seat(conn, session)
+            cursor = conn.execute(
+                'UPDATE participants SET name = ?, email = ?, session = ? WHERE id = ?',
+                (name, email, session, participant_id)
+            )
+        return cursor.rowcount > 0
+
+    def delete_participant(self, participant_id):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM payments WHERE participant_id = ?', (participant_id,))
+            conn.execute('DELETE FROM participants WHERE id = ?', (participant_id,))
+        return True
+
+    def session_occupancy(self):
+        return {row['session']: int(row['taken']) for row in self._all('SELECT session, taken FROM session_seats')}
+
+    def data_version(self, tables):
+        placeholders = ', '.join('?' * len(tables))
+        rows = {row['name']: row for row in self._all(
+            f"SELECT name, version, modified FROM table_versions WHERE name IN ('database', {placeholders})",
+            tuple(tables)
+        )}
+        # The database's random number tells a recreated file from the old one
+        version = ';'.join(rows[name]['version'] if name in rows else '0' for name in ('database', *tables))
+        modified = [float(rows[name]['modified']) for name in tables if rows.get(name, {}).get('modified')]
+        return version, max(modified, default=None)
+
+    def session_stats(self, session_id):
+        conn = self._connect()
+        metrics.record_storage(queries=2)
+        # One read transaction so the totals and the histogram agree
+        conn.execute('BEGIN')
+        try:
+            totals = conn.execute(
+                'SELECT registrations, paid, revenue FROM session_stats WHERE session = ?', (session_id,)
+            ).fetchone() or {'registrations': '0', 'paid': '0', 'revenue': '0'}
+            daily = conn.execute(
+                'SELECT day, registrations FROM session_daily_registrations WHERE session = ?', (session_id,)
+            ).fetchall()
+        finally:
+            conn.execute('COMMIT')
+        return session_stats_result(int(totals['registrations']), int(totals['paid']), float(totals['revenue']),
+                                    {row['day']: int(row['registrations']) for row in daily})
+
+    def _participants_snapshot(self):
+        """Every participant and the change sequence number they reflect, read consistently"""
+        conn = self._connect()
+        metrics.record_storage(queries=2)
+        conn.execute('BEGIN')
+        try:
+            seq = conn.execute('SELECT COALESCE(MAX(seq), 0) AS seq FROM participant_changes').fetchone()['seq']
+            rows = conn.execute(
+                'SELECT id, name, email, session, registration_date FROM participants ORDER BY id'
+            ).fetchall()
+        finally:
+            conn.execute('COMMIT')
+        return int(seq), rows
+
+    def watch_participants(self, listener):
+        with self._watch_lock:
+            self._watched_seq, rows = self._participants_snapshot()
+            for watcher in self._watchers:
+                watcher.reset(rows)
+            self._watchers.append(listener)
+            listener.reset(rows)
+
+    def refresh_participants(self):
+        with self._watch_lock:
+            if not self._watchers:
+                return
+            latest = self._one(
+                'SELECT COALESCE(MAX(seq), 0) AS latest, COALESCE(MIN(seq), 0) AS oldest FROM participant_changes'
+            )
+            latest, oldest = int(latest['latest']), int(latest['oldest'])
+            if latest == self._watched_seq:
+                return
+            if latest - self._watched_seq > self.MAX_CATCH_UP or oldest > self._watched_seq + 1:
+                # Too far behind, or the log was pruned past our position
+                self._watched_seq, rows = self._participants_snapshot()
+                for watcher in self._watchers:
+                    watcher.reset(rows)
+                return
+
+            changed = [row['participant_id'] for row in self._all(
+                'SELECT DISTINCT participant_id FROM participant_changes WHERE seq > ? AND seq <= ?',
+                (self._watched_seq, latest)
+            )]
+            current = {}
+            for start in range(0, len(changed), 500):
+                chunk = changed[start:start + 500]
+                for row in self._all(
+                    'SELECT id, name, email, session, registration_date FROM participants '
+                    f"WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ):
+                    current[row['id']] = row
+            for participant_id in changed:
+                for watcher in self._watchers:
+                    if participant_id in current:
+                        watcher.put(current[participant_id])
+                    else:
+                        watcher.discard(participant_id)
+            self._watched_seq = latest
+
+    def _listing_query(self, session, status, suffix=''):
+        clauses, params = [], []
+        if session:
+            clauses.append('p.session = ?')
+            params.append(session)
+        if status == 'completed':
+            clauses.append("pay.status = 'completed'")
+        elif status == 'pending':
+            clauses.append("(pay.status IS NULL OR pay.status != 'completed')")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        sql = (
+            'SELECT p.id, p.name, p.email, p.session, p.registration_date, '
+            's.name AS session_name, pay.status AS payment_status, pay.amount AS payment_amount '
+            'FROM participants p '
+            'LEFT JOIN sessions s ON s.id = p.session '
+            'LEFT JOIN payments pay ON pay.id = '
+            '(SELECT MIN(id) FROM payments WHERE participant_id = p.id) '
+            f'{where} ORDER BY p.id{suffix}'
+        )
+        return sql, params
+
+    def _listing_rows(self, cursor):
+        for row in cursor:
+            if not row['payment_status']:
+                row['payment_status'] = 'Pending'
+                del row['payment_amount']
+            yield row
+
+    def iter_participants(self, session=None, status=None):
+        sql, params = self._listing_query(session, status)
+        return self._listing_rows(self._execute(sql, params))
+
+    def list_participants(self, offset, limit, session=None, status=None):
+        sql, params = self._listing_query(session, status, ' LIMIT ? OFFSET ?')
+        return list(self._listing_rows(self._execute(sql, params + [limit, offset])))
+
+    def import_from(self, source):
+        """Copy every row of another storage into this database, keeping ids"""
+        with self._transaction() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO sessions (id, name, date, capacity, price) VALUES (?, ?, ?, ?, ?)',
+                ((s['id'], s['name'], _null(s.get('date')), _null(s.get('capacity')), _null(s.get('price')))
+                 for s in source.get_sessions())
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO participants (id, name, email, session, registration_date) '
+                'VALUES (?, ?, ?, ?, ?)',
+                ((p['id'], p['name'], p['email'], p['session'], p['registration_date'])
+                 for p in source.get_participants())
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO payments (id, participant_id, amount, payment_date, status) '
+                'VALUES (?, ?, ?, ?, ?)',
+                ((p['id'], p['participant_id'], _null(p['amount']), p['payment_date'], p['status'])
+                 for p in source.get_payments())
+            )
+            # INSERT OR REPLACE does not fire the delete triggers
+            self._rebuild_seats(conn)
+            self._rebuild_stats(conn)
@@ -0,0 +1,42 @@
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import PARTICIPANT_FIELDS, PAYMENT_FIELDS, SESSION_FIELDS, CSVStorage, SQLiteStorage  # noqa: E402
+
+SESSION_IDS = ['1', '2', '3']
+BACKENDS = ['csv', 'csv-append-only', 'sqlite']
+
+
+def write_csv_files(directory):
+    """Write empty participants/payments files and three sessions without a capacity limit"""
+    tables = [('participants', PARTICIPANT_FIELDS, []),
+              ('sessions', SESSION_FIELDS, [[i, f'Session {i}', '2025-04-01', '', '50'] for i in SESSION_IDS]),
+              ('payments', PAYMENT_FIELDS, [])]
+    paths = []
+    for name, fields, rows in tables:
+        paths.append(os.path.join(directory, f'{name}.csv'))
+        with open(paths[-1], 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            writer.writerows(rows)
+    return paths
+
+
+@pytest.fixture(params=BACKENDS)
+def open_storage(request, tmp_path):
+    """Open a storage of each backend; every call opens another instance on the same data
+
+    Two instances share nothing but the files, the way two worker processes do.
+    """
+    paths = write_csv_files(str(tmp_path))
+    if request.param == 'sqlite':
+        database = str(tmp_path / 'conference.db')
+        SQLiteStorage(database).import_from(CSVStorage(*paths))
+        return lambda: SQLiteStorage(database)
+    append_only = request.param == 'csv-append-only'
+    return lambda: CSVStorage(*paths, append_only=append_only)
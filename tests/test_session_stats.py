@@ -0,0 +1,90 @@
+"""Running session statistics checked against a brute-force recount"""
+from collections import Counter, defaultdict
+import random
+
+import pytest
+
+from analytics import session_stats_result
+from conftest import SESSION_IDS
+
+AMOUNTS = ['10', '25.5', '99.99']
+DATES = ['2025-02-01', '2025-02-02', '2025-02-03', '']
+
+
+def recount(storage, session_id):
+    """Session statistics computed from scratch out of every participant and payment"""
+    completed = defaultdict(float)
+    paid = set()
+    for payment in storage.get_payments():
+        if payment['status'] == 'completed':
+            completed[payment['participant_id']] += float(payment['amount'])
+            paid.add(payment['participant_id'])
+    participants = [p for p in storage.get_participants() if p['session'] == session_id]
+    return session_stats_result(
+        len(participants),
+        sum(1 for p in participants if p['id'] in paid),
+        sum(completed[p['id']] for p in participants),
+        Counter(p['registration_date'] or '' for p in participants)
+    )
+
+
+def assert_stats_match(storage):
+    for session_id in SESSION_IDS:
+        stats = storage.session_stats(session_id)
+        expected = recount(storage, session_id)
+        assert stats['revenue'] == pytest.approx(expected.pop('revenue'))
+        assert {key: value for key, value in stats.items() if key != 'revenue'} == expected
+
+
+def random_change(rng, storage, step):
+    """Register, pay, move or delete a random participant through ``storage``"""
+    ids = [p['id'] for p in storage.get_participants()]
+    op = rng.random()
+    if op < 0.35 or not ids:
+        storage.register(f'Person {step}', f'p{step}@example.com', rng.choice(SESSION_IDS),
+                         rng.choice(AMOUNTS), rng.choice(DATES))
+    elif op < 0.5:
+        storage.add_participant(f'Unpaid {step}', f'u{step}@example.com', rng.choice(SESSION_IDS), rng.choice(DATES))
+    elif op < 0.7:
+        storage.add_payment(rng.choice(ids), rng.choice(AMOUNTS), rng.choice(DATES),
+                            status=rng.choice(['completed', 'pending']))
+    elif op < 0.85:
+        storage.update_participant(rng.choice(ids), f'Moved {step}', f'm{step}@example.com', rng.choice(SESSION_IDS))
+    else:
+        storage.delete_participant(rng.choice(ids))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_stats_follow_random_changes(open_storage, seed):
+    storage = open_storage()
+    rng = random.Random(seed)
+    assert_stats_match(storage)
+    for step in range(120):
+        random_change(rng, storage, step)
+        if step % 10 == 0:
+            assert_stats_match(storage)
+    assert_stats_match(storage)
+
+
+def test_stats_follow_changes_from_another_instance(open_storage):
+    reader, writer = open_storage(), open_storage()
+    rng = random.Random(0)
+    assert_stats_match(reader)
+    for step in range(80):
+        random_change(rng, rng.choice([reader, writer]), step)
+        if step % 5 == 0:
+            assert_stats_match(reader)
+            assert_stats_match(writer)
+    assert_stats_match(reader)
+    assert_stats_match(writer)
+
+
+def test_stats_survive_compaction(open_storage):
+    storage, other = open_storage(), open_storage()
+    rng = random.Random(1)
+    assert_stats_match(storage)
+    for step in range(60):
+        random_change(rng, other, step)
+        if step % 15 == 0:
+            other.compact(0.0)
+    assert_stats_match(storage)
@@ -0,0 +1,102 @@
+"""Two storage instances on the same data, the way two worker processes see it"""
+import csv
+import random
+import threading
+
+import pytest
+
+from conftest import SESSION_IDS
+from storage import PARTICIPANT_FIELDS, CSVTable
+
+
+def participants_of(storage):
+    return sorted((p['id'], p['name'], p['session']) for p in storage.get_participants())
+
+
+def random_write(rng, storage, step):
+    """Register, edit, delete or compact through ``storage``"""
+    ids = [p['id'] for p in storage.get_participants()]
+    op = rng.random()
+    if op < 0.4 or not ids:
+        storage.register(f'Person {step}', f'p{step}@example.com', rng.choice(SESSION_IDS), '10', '2025-02-01')
+    elif op < 0.6:
+        storage.delete_participant(rng.choice(ids))
+    elif op < 0.8:
+        storage.update_participant(rng.choice(ids), f'Edited {step}', f'e{step}@example.com', rng.choice(SESSION_IDS))
+    else:
+        storage.compact(0.0)
+
+
+class Mirror:
+    """A watcher keeping its own copy of the participants"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def reset(self, rows):
+        self.rows = {row['id']: dict(row) for row in rows}
+
+    def put(self, row):
+        self.rows[row['id']] = dict(row)
+
+    def discard(self, key):
+        self.rows.pop(key, None)
+
+    def participants(self):
+        return sorted((row['id'], row['name'], row['session']) for row in self.rows.values())
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_reader_sees_writes_of_another_instance(open_storage, seed):
+    reader, writer = open_storage(), open_storage()
+    rng = random.Random(seed)
+    for step in range(60):
+        random_write(rng, writer, step)
+        if rng.random() < 0.5:
+            assert participants_of(reader) == participants_of(open_storage())
+    assert participants_of(reader) == participants_of(writer)
+
+
+def test_watchers_follow_writes_of_both_instances(open_storage):
+    reader, writer = open_storage(), open_storage()
+    mirror = Mirror()
+    reader.watch_participants(mirror)
+    rng = random.Random(0)
+    for step in range(80):
+        random_write(rng, rng.choice([reader, writer]), step)
+        if step % 5 == 0:
+            reader.refresh_participants()
+            assert mirror.participants() == participants_of(writer)
+    reader.refresh_participants()
+    assert mirror.participants() == participants_of(writer)
+
+
+@pytest.mark.parametrize('append_only', [False, True])
+def test_concurrent_refreshes_load_an_append_once(tmp_path, append_only):
+    path = str(tmp_path / 'participants.csv')
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(PARTICIPANT_FIELDS)
+        writer.writerows([i, f'Person {i}', f'p{i}@example.com', '1', '2025-02-01'] for i in range(1, 1001))
+    reader = CSVTable(path, PARTICIPANT_FIELDS, append_only=append_only)
+    other = CSVTable(path, PARTICIPANT_FIELDS, append_only=append_only)
+    mirror = Mirror()
+    reader.watch(mirror)
+    resets = []
+    mirror.reset = lambda rows, reset=mirror.reset: (resets.append(1), reset(rows))
+
+    for step in range(5):
+        other.append([1001 + step, f'New {step}', f'n{step}@example.com', '2', '2025-02-02'])
+        barrier = threading.Barrier(8)
+
+        def refresh():
+            barrier.wait()
+            reader.refresh()
+        threads = [threading.Thread(target=refresh) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert not resets
+    assert len(mirror.rows) == len(reader.rows()) == 1005